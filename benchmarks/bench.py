@@ -0,0 +1,281 @@
+"""
+Benchmarks of the platformer hot paths on synthetic levels.
+
+Every benchmark runs headless against a generated level and reports the
+mean, median, 95th percentile and maximum time of its samples in
+milliseconds. Results can be saved as JSON and compared against a previous
+run, any benchmark whose median got slower than the baseline by more than the
+threshold is reported as a regression and makes the run fail.
+
+Usage:
+    python benchmarks/bench.py --output results.json
+    python benchmarks/bench.py --baseline benchmarks/baseline.json
+"""
+import os
+import sys
+import json
+import platform
+import argparse
+import statistics
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'src'))
+
+import pygame  # noqa: E402
+import numpy as np  # noqa: E402
+
+from time import perf_counter  # noqa: E402
+
+from settings import TILE_SIZE, GAME_WIDTH  # noqa: E402
+from controls import KeyboardInput, KeyState  # noqa: E402
+from levels import load_level  # noqa: E402
+from main import Game, summarize  # noqa: E402
+from synthetic import generate_level, level_path  # noqa: E402
+
+
+class ScriptedInput(KeyboardInput):
+    """
+    Holds right all the time and jumps every ``jump_every`` steps.
+    """
+    def __init__(self, jump_every=40):
+        self.jump_every = jump_every
+        self.steps = 0
+        self.keys = KeyState()
+
+    def step(self, dt, events):
+        keys = [pygame.K_RIGHT]
+        if self.steps % self.jump_every == 0:
+            keys.append(pygame.K_SPACE)
+
+        self.keys = KeyState(keys)
+        self.steps += 1
+        return events
+
+    def pressed(self):
+        return self.keys
+
+
+def measure(function, samples):
+    durations = []
+    for sample in range(samples):
+        start = perf_counter()
+        function(sample)
+        durations.append(perf_counter() - start)
+
+    return dict(summarize(durations),
+                median=statistics.median(durations) * 1000,
+                samples=samples)
+
+
+def enter_level(state, filename):
+    """
+    Replaces the level being played by filename, like
+    PlatformerGame.change_level does.
+    """
+    for group in state.sprite_groups.values():
+        group.empty()
+    state.collision_grid.clear()
+    state.triggers.clear()
+    state.animations.clear()
+    state.particles.clear()
+
+    state.levels = {1: filename}
+    state.current_level = 1
+    state.load_map(filename, state.sprite_groups)
+
+
+def move_player(player, x, y):
+    player.rect.topleft = (x, y)
+    player.hitbox_rect.midbottom = player.rect.midbottom
+    player.old_rect = player.hitbox_rect.copy()
+
+
+def run_benchmarks(filename, frames=600, particles=5000):
+    game = Game(ScriptedInput())
+    state = game.controller.state('PlatformerGame')
+    # load_map prefetches the next level, here the benchmarked one again:
+    # load_map samples would pick up the prefetch instead of loading, and
+    # prefetches would run in the background of the other benchmarks
+    state.prefetcher.enabled = False
+    state.prefetcher.cancel()
+    level_width = load_level(filename).width * TILE_SIZE
+    results = {}
+
+    # level loading, from the TMX file and from the compiled cache
+    results['parse_level'] = measure(
+        lambda sample: load_level(filename, use_cache=False), 3)
+    results['load_level_cached'] = measure(
+        lambda sample: load_level(filename), 5)
+    results['load_map'] = measure(
+        lambda sample: enter_level(state, filename), 3)
+
+    # player collision against the terrain, each sample resolves 100
+    # positions spread over the screen around the spawn point, which is
+    # loaded in streamed levels too
+    player = state.player
+    spawn = player.rect.topleft
+    positions = [(max(0, spawn[0] - GAME_WIDTH // 2) + GAME_WIDTH * i // 100,
+                  spawn[1]) for i in range(100)]
+
+    def player_collision(sample):
+        for position in positions:
+            move_player(player, *position)
+            player.collision('horizontal')
+            player.collision('vertical')
+            player.check_on_surface()
+
+    results['player_collision'] = measure(player_collision, 50)
+
+    # camera drawing while sweeping the level from left to right, chunks
+    # of streamed levels are streamed in and out along the way
+    canvas = game.canvas
+    camera = state.sprite_groups['all']
+    step = max(1, level_width // 500)
+
+    def custom_draw(sample):
+        move_player(player, (sample * step) % level_width, spawn[1])
+        if state.streamer is not None:
+            state.streamer.update(player.rect)
+        camera.custom_draw(canvas, player)
+
+    results['custom_draw'] = measure(custom_draw, 500)
+
+    # item collision with the player away from every item
+    enter_level(state, filename)
+    move_player(player, spawn[0], -TILE_SIZE * 10)
+    results['item_collision'] = measure(
+        lambda sample: state.item_collision(), 500)
+
+    # particle system with ``particles`` live particles
+    move_player(player, *spawn)
+    camera.update_target(player.rect)
+    state.particles.clear()
+
+    # slow particles spreading around the player, they stay on screen
+    state.particles.emit(particles,
+                         pos=(spawn[0] + GAME_WIDTH / 4, spawn[1]),
+                         direction=np.random.uniform(-1, 1, (particles, 2)),
+                         speed=10,
+                         size=3,
+                         color=(255, 255, 255),
+                         lifespan=60000)
+    results['particles_update'] = measure(
+        lambda sample: state.particles.update(1 / 30), 200)
+    results['particles_draw'] = measure(
+        lambda sample: state.particles.draw(canvas, camera.offset), 200)
+
+    # whole headless frames, playing the level with scripted input
+    enter_level(state, filename)
+
+    def frame(sample):
+        game.controller.update(1 / 30, [])
+        game.controller.draw(canvas)
+
+    results['frame'] = measure(frame, frames)
+
+    pygame.quit()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns the names of the benchmarks whose median is slower than in the
+    baseline by more than threshold (a fraction, 0.2 is 20%).
+    """
+    regressions = []
+
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference or not reference['median']:
+            continue
+
+        change = result['median'] / reference['median'] - 1
+        if change > threshold:
+            regressions.append(name)
+
+    return regressions
+
+
+def print_results(results, baseline=None):
+    for name, result in results.items():
+        line = (f'{name:<18} mean {result["mean"]:9.3f}ms  '
+                f'median {result["median"]:9.3f}ms  '
+                f'p95 {result["p95"]:9.3f}ms  max {result["max"]:9.3f}ms')
+
+        reference = baseline.get(name) if baseline else None
+        if reference and reference['median']:
+            change = (result['median'] / reference['median'] - 1) * 100
+            line += f'  {change:+7.1f}%'
+
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--width', type=int, default=1000,
+                        help='level width in tiles')
+    parser.add_argument('--height', type=int, default=200,
+                        help='level height in tiles')
+    parser.add_argument('--coins', type=int, default=5000)
+    parser.add_argument('--flags', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--infinite', action='store_true',
+                        help='generate an infinite, chunked map')
+    parser.add_argument('--frames', type=int, default=600,
+                        help='number of end-to-end frames')
+    parser.add_argument('--particles', type=int, default=5000)
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the results as JSON to FILE')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare the results against FILE')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+
+    filename = level_path(args.width, args.height, args.coins, args.flags,
+                          args.seed, args.infinite)
+    if not os.path.exists(filename):
+        generate_level(filename, args.width, args.height, args.coins,
+                       args.flags, args.seed, args.infinite)
+
+    # the baseline is read before running, a missing one is written with
+    # the results instead of failing once the benchmarks are done
+    baseline = None
+    outputs = [args.output] if args.output else []
+    if args.baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file)['benchmarks']
+        else:
+            print(f'no baseline at {args.baseline}, the results will be '
+                  f'saved as the baseline')
+            outputs.append(args.baseline)
+
+    results = run_benchmarks(filename, args.frames, args.particles)
+
+    print_results(results, baseline)
+
+    for output in outputs:
+        with open(output, 'w') as file:
+            json.dump({
+                'level': {'width': args.width, 'height': args.height,
+                          'coins': args.coins, 'flags': args.flags,
+                          'seed': args.seed, 'infinite': args.infinite},
+                'environment': {'python': platform.python_version(),
+                                'pygame': pygame.version.ver,
+                                'machine': platform.machine()},
+                'benchmarks': results,
+            }, file, indent=2)
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'regressions over {args.threshold:.0%}: '
+                  + ', '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+import os
+import random
+
+from functools import partial
+
+from settings import TILE_SIZE, TILED_DIR, ROOT_DIR
+
+
+BENCHMARK_LEVEL_DIR = os.path.join(ROOT_DIR, 'data/cache/benchmark')
+
+# gids of the example levels tilesets
+TERRAIN_GID = 63
+DECORATION_GIDS = (125, 126, 129, 132)
+COIN_GID = 152
+KEY_GID = 28
+FLAG_GID = 112
+PLAYER_GID = 181 | 0x80000000
+
+
+def csv_layer(layer_id, name, width, height, gids):
+    rows = []
+    for y in range(height):
+        rows.append(','.join(str(gid) for gid in gids[y * width:(y + 1) * width]))  # noqa: E501
+
+    return (f' <layer id="{layer_id}" name="{name}" width="{width}" '
+            f'height="{height}">\n'
+            '  <data encoding="csv">\n' + ',\n'.join(rows) + '\n</data>\n'
+            ' </layer>\n')
+
+
+def chunked_layer(layer_id, name, width, height, gids, origin, chunk=16):
+    """
+    Writes a layer of an infinite map as chunk x chunk tiles <chunk> nodes,
+    the top left tile of the level being placed at tile origin. Empty
+    chunks are left out like Tiled does.
+    """
+    chunks = []
+    for top in range(0, height, chunk):
+        for left in range(0, width, chunk):
+            rows = []
+            for y in range(top, top + chunk):
+                rows.append(','.join(
+                    str(gids[y * width + x]) if x < width and y < height else '0'  # noqa: E501
+                    for x in range(left, left + chunk)))
+
+            if any(row.strip('0,') for row in rows):
+                chunks.append(
+                    f'   <chunk x="{left + origin[0]}" y="{top + origin[1]}" '
+                    f'width="{chunk}" height="{chunk}">\n'
+                    + ',\n'.join(rows) + '\n</chunk>\n')
+
+    return (f' <layer id="{layer_id}" name="{name}" width="{width}" '
+            f'height="{height}">\n'
+            '  <data encoding="csv">\n' + ''.join(chunks) + '  </data>\n'
+            ' </layer>\n')
+
+
+def tile_object(object_id, name, type, gid, x, y, width=TILE_SIZE,
+                height=TILE_SIZE):
+    # tile objects are anchored at their bottom left corner
+    return (f'  <object id="{object_id}" name="{name}" type="{type}" '
+            f'gid="{gid}" x="{x}" y="{y + height}" width="{width}" '
+            f'height="{height}"/>\n')
+
+
+def generate_level(path, width=1000, height=200, coins=5000, flags=500,
+                   seed=0, infinite=False):
+    """
+    Writes a synthetic TMX level using the example levels tilesets.
+
+    The level has a solid floor, random floating platforms and decorations,
+    ``coins`` coins spread over the floor and the platforms, ``flags``
+    animated flags, a key, the player near the left edge and the checkpoint
+    at the right edge. The same arguments always produce the same file.
+
+    :param str path: Where to write the TMX file.
+    :param int width: Level width in tiles.
+    :param int height: Level height in tiles.
+    :param int coins: Number of coins.
+    :param int flags: Number of animated flags.
+    :param int seed: Seed of the random layout.
+    :param bool infinite: Write an infinite map made of chunks, placed at
+        negative coordinates to the top left like maps extended in Tiled.
+
+    :returns: path
+    """
+    rng = random.Random(seed)
+    terrain = [0] * (width * height)
+    background = [0] * (width * height)
+    foreground = [0] * (width * height)
+
+    # floor, two tiles thick
+    floor = height - 2
+    for y in (floor, floor + 1):
+        for x in range(width):
+            terrain[y * width + x] = TERRAIN_GID
+
+    # floating platforms, a few tiles apart from each other vertically
+    surfaces = [(x, floor) for x in range(width)]
+    for y in range(floor - 4, 1, -4):
+        x = rng.randrange(8)
+        while x < width:
+            length = rng.randint(3, 8)
+            for column in range(x, min(x + length, width)):
+                terrain[y * width + column] = TERRAIN_GID
+                surfaces.append((column, y))
+            x += length + rng.randint(4, 12)
+
+    # decorations standing on the terrain
+    for x, y in rng.sample(surfaces, min(len(surfaces) // 4, width * 4)):
+        layer = background if rng.random() < 0.5 else foreground
+        layer[(y - 1) * width + x] = rng.choice(DECORATION_GIDS)
+
+    # infinite maps start at the top left of chunks at negative coordinates
+    origin = (-32, -16) if infinite else (0, 0)
+    left, top = origin[0] * TILE_SIZE, origin[1] * TILE_SIZE
+
+    player = (left + 4 * TILE_SIZE, top + (floor - 2) * TILE_SIZE)
+    checkpoint = (left + (width - 2) * TILE_SIZE,
+                  top + (floor - 2) * TILE_SIZE)
+
+    object_id = 1
+    items = []
+    spots = rng.sample(surfaces, min(coins + flags + 1, len(surfaces)))
+    for x, y in spots[:coins]:
+        items.append(tile_object(object_id, 'coin', 'Coin', COIN_GID,
+                                 left + x * TILE_SIZE,
+                                 top + (y - 1) * TILE_SIZE))
+        object_id += 1
+
+    x, y = spots[coins] if len(spots) > coins else (8, floor)
+    items.append(tile_object(object_id, 'key', 'Key', KEY_GID,
+                             left + x * TILE_SIZE, top + (y - 1) * TILE_SIZE))
+    object_id += 1
+
+    items.append(f'  <object id="{object_id}" name="checkpoint" '
+                 f'x="{checkpoint[0]}" y="{checkpoint[1]}" '
+                 f'width="{TILE_SIZE}" height="{TILE_SIZE * 2}"/>\n')
+    object_id += 1
+
+    animated = []
+    for x, y in spots[coins + 1:coins + 1 + flags]:
+        animated.append(tile_object(object_id, 'flag', 'Flag', FLAG_GID,
+                                    left + x * TILE_SIZE,
+                                    top + (y - 1) * TILE_SIZE))
+        object_id += 1
+
+    player_object = tile_object(object_id, 'player', 'Player', PLAYER_GID,
+                                player[0], player[1], 24, 24)
+    object_id += 1
+
+    directory = os.path.dirname(os.path.abspath(path))
+    tiles_tsx = os.path.relpath(os.path.join(TILED_DIR, 'tileset-tiles.tsx'),
+                                directory)
+    characters_tsx = os.path.relpath(
+        os.path.join(TILED_DIR, 'tileset-characters.tsx'), directory)
+
+    if infinite:
+        layer = partial(chunked_layer, origin=origin)
+    else:
+        layer = csv_layer
+
+    os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<map version="1.10" orientation="orthogonal" '
+            f'renderorder="right-down" width="{width}" height="{height}" '
+            f'tilewidth="{TILE_SIZE}" tileheight="{TILE_SIZE}" '
+            f'infinite="{int(infinite)}" '
+            f'nextlayerid="7" nextobjectid="{object_id}">\n'
+            f' <tileset firstgid="1" source="{tiles_tsx}"/>\n'
+            f' <tileset firstgid="181" source="{characters_tsx}"/>\n'
+        )
+        file.write(layer(4, 'foreground', width, height, foreground))
+        file.write(' <objectgroup id="5" name="player">\n'
+                   + player_object + ' </objectgroup>\n')
+        file.write(' <objectgroup id="3" name="items">\n'
+                   + ''.join(items) + ' </objectgroup>\n')
+        file.write(layer(1, 'terrain', width, height, terrain))
+        file.write(' <objectgroup id="6" name="animated_bg">\n'
+                   + ''.join(animated) + ' </objectgroup>\n')
+        file.write(layer(2, 'background', width, height, background))
+        file.write('</map>\n')
+
+    return path
+
+
+def level_path(width, height, coins, flags, seed=0, infinite=False):
+    kind = 'infinite' if infinite else 'synthetic'
+    name = f'{kind}-{width}x{height}-{coins}c-{flags}f-{seed}.tmx'
+    return os.path.join(BENCHMARK_LEVEL_DIR, name)
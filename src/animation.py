@@ -0,0 +1,45 @@
+class AnimationTrack:
+    """
+    Shared clock of a looping animation: frames played at speed frames per
+    second. Sprites showing the track read frame() instead of keeping
+    their own frame counter.
+    """
+    def __init__(self, frames, speed):
+        self.frames = frames
+        self.speed = speed
+        self.position = 0
+
+    def advance(self, dt):
+        self.position += self.speed * dt
+
+    def frame(self, phase=0):
+        """
+        Returns the current frame, or the frame phase frames ahead of it.
+        """
+        return self.frames[int((self.position + phase) % len(self.frames))]
+
+
+class AnimationClock:
+    """
+    Named animation tracks advanced together once per frame, so the cost
+    of animating does not grow with the number of sprites using a track.
+    """
+    def __init__(self):
+        self.tracks = {}
+
+    def track(self, name, frames, speed):
+        """
+        Returns the track called name, created with frames and speed the
+        first time it is asked for.
+        """
+        track = self.tracks.get(name)
+        if track is None:
+            track = self.tracks[name] = AnimationTrack(frames, speed)
+        return track
+
+    def update(self, dt):
+        for track in self.tracks.values():
+            track.advance(dt)
+
+    def clear(self):
+        self.tracks.clear()
@@ -0,0 +1,221 @@
+import os
+import json
+import pygame
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from settings import (GRAPHICS_DIR, ASSET_MANIFEST, BAKED_ASSETS_DIR,
+                      ATLAS_SIZE)
+from loaders import BAKE_VERSION, index_path, page_path, source_stat
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tga')
+
+
+def image_files(directory=GRAPHICS_DIR):
+    for folder_path, _, file_list in os.walk(directory):
+        for filename in sorted(file_list):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.relpath(os.path.join(folder_path, filename),
+                                      directory)
+
+
+def read_manifest(path=ASSET_MANIFEST):
+    """
+    Returns the frame size of the sheets listed in the manifest by path
+    relative to GRAPHICS_DIR, no sheets when there is no manifest.
+    """
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as file:
+        manifest = json.load(file)
+
+    return {os.path.normpath(name): tuple(entry['frame_size'])
+            for name, entry in manifest.items()}
+
+
+def init_worker():
+    # converting images needs a display, the dummy one does
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+
+
+def decode_image(job):
+    """
+    Decodes an image the way loaders.decode_image() does and returns its
+    BGRA pixels as a (height, width, 4) array.
+    """
+    directory, name = job
+
+    surface = pygame.image.load(os.path.join(directory, name)).convert_alpha()
+    width, height = surface.get_size()
+    return np.frombuffer(pygame.image.tobytes(surface, 'BGRA'),
+                         dtype=np.uint8).reshape(height, width, 4)
+
+
+def slice_frames(size, frame_size):
+    """
+    Returns the (x, y) of the frames of a sheet in row-major order, like
+    loaders.slice_sprite_sheet() cuts them.
+    """
+    width, height = size
+    frame_width, frame_height = frame_size
+    return [(x, y)
+            for y in range(0, height - frame_height + 1, frame_height)
+            for x in range(0, width - frame_width + 1, frame_width)]
+
+
+def pack_rects(sizes, atlas_size=ATLAS_SIZE):
+    """
+    Places (width, height) rects on atlas pages using shelves: rects are
+    sorted by height and laid left to right in rows as tall as their first
+    rect. Rects larger than a page get a page of their own.
+
+    :returns: The (page, x, y) of every rect and the (width, height) of the
+              pages, trimmed to what they hold.
+    """
+    placements = [None] * len(sizes)
+    pages = []
+    x = y = shelf_height = 0
+    page = number = None
+
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))  # noqa: E501
+    for i in order:
+        width, height = sizes[i]
+
+        if width > atlas_size or height > atlas_size:
+            pages.append([width, height])
+            placements[i] = (len(pages) - 1, 0, 0)
+            continue
+
+        if page is not None and x + width > atlas_size:
+            x, y, shelf_height = 0, y + shelf_height, 0
+
+        if page is None or y + height > atlas_size:
+            page, number = [0, 0], len(pages)
+            pages.append(page)
+            x = y = shelf_height = 0
+
+        placements[i] = (number, x, y)
+        page[0] = max(page[0], x + width)
+        page[1] = max(page[1], y + height)
+
+        x += width
+        shelf_height = max(shelf_height, height)
+
+    return placements, pages
+
+
+def bake_assets(directory=GRAPHICS_DIR, output=BAKED_ASSETS_DIR,
+                atlas_size=ATLAS_SIZE, workers=None):
+    """
+    Bakes every image of directory into output: images are decoded in a
+    process pool, packed into atlas pages written as raw BGRA pixels, and
+    listed in a JSON index with their place in the pages and, for the
+    sheets of the manifest, the place of their frames.
+
+    :returns: The index written.
+    """
+    manifest = read_manifest()
+    names = list(image_files(directory))
+
+    with ProcessPoolExecutor(max_workers=workers,
+                             initializer=init_worker) as executor:
+        decoded = list(executor.map(decode_image,
+                                    [(directory, name) for name in names]))
+
+    placements, pages = pack_rects(
+        [(pixels.shape[1], pixels.shape[0]) for pixels in decoded],
+        atlas_size)
+
+    page_pixels = [np.zeros((height, width, 4), dtype=np.uint8)
+                   for width, height in pages]
+    images = {}
+    for name, pixels, (page, x, y) in zip(names, decoded, placements):
+        height, width = pixels.shape[:2]
+        page_pixels[page][y:y + height, x:x + width] = pixels
+
+        name = os.path.normpath(name)
+        frame_size = manifest.get(name)
+        images[name] = {
+            'stat': source_stat(os.path.join(directory, name)),
+            'page': page,
+            'rect': [x, y, width, height],
+            'frame_size': frame_size,
+            'frames': [[x + left, y + top] for left, top
+                       in slice_frames((width, height), frame_size)]
+            if frame_size else None,
+        }
+
+    os.makedirs(output, exist_ok=True)
+    # the index of an earlier bake would describe the pages overwritten
+    # below, it is removed first and written last so a bake interrupted
+    # in between leaves no index and is not used
+    try:
+        os.remove(index_path(output))
+    except FileNotFoundError:
+        pass
+
+    for number, pixels in enumerate(page_pixels):
+        with open(page_path(output, number), 'wb') as file:
+            file.write(pixels.tobytes())
+
+    index = {'version': BAKE_VERSION, 'pages': pages, 'images': images}
+    temp_path = f'{index_path(output)}.{os.getpid()}.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(index, file)
+    os.replace(temp_path, index_path(output))
+
+    return index
+
+
+def compare_load_times(repeat=10):
+    """
+    Prints the average time to load every image of GRAPHICS_DIR from a
+    cold loader, decoding the PNG files versus mapping the baked pages.
+    """
+    import loaders
+
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+
+    def load_all(baked):
+        loaders.registry.clear()
+        loaders.baked = loaders.BakedAssets() if baked else None
+        for name in image_files():
+            loaders.load_image(name)
+
+    timings = []
+    for baked in (False, True):
+        start = perf_counter()
+        for _ in range(repeat):
+            load_all(baked)
+        timings.append((perf_counter() - start) / repeat * 1000)
+
+    print(f'{"png":>10} {"baked":>10} {"speedup":>8}')
+    print(f'{timings[0]:>8.2f}ms {timings[1]:>8.2f}ms '
+          f'{timings[0] / timings[1]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Baked asset atlases.')
+    parser.add_argument('command', choices=('bake', 'compare'),
+                        nargs='?', default='bake')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--atlas-size', type=int, default=ATLAS_SIZE)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == 'bake':
+        start = perf_counter()
+        index = bake_assets(atlas_size=args.atlas_size, workers=args.workers)
+        print(f'baked {len(index["images"])} images into '
+              f'{len(index["pages"])} pages in '
+              f'{(perf_counter() - start) * 1000:.0f}ms')
+    else:
+        compare_load_times(args.repeat)
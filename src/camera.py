@@ -1,12 +1,93 @@
 import pygame
 
-from settings import GAME_WIDTH, GAME_HEIGHT
+from itertools import count
+
+from settings import (GAME_WIDTH, GAME_HEIGHT, TILE_SIZE, CHUNK_TILES,
+                      CULL_MARGIN, CULL_UPDATES)
+from spatial import SpatialHash
+
+
+class StaticLayerRenderer:
+    """
+    Pre-renders static tile layers into fixed size chunk surfaces.
+
+    Tiles are composited into their chunk in the order they are added, so
+    adding the layers back to front keeps their draw order. At draw time
+    only the chunks intersecting the camera are blitted.
+    """
+    def __init__(self, chunk_tiles=CHUNK_TILES):
+        self.chunk_size = chunk_tiles * TILE_SIZE
+        self.chunks = {}
+
+    def add_tile(self, pos, surface):
+        key = (pos[0] // self.chunk_size, pos[1] // self.chunk_size)
+
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = pygame.Surface((self.chunk_size, self.chunk_size),
+                                   pygame.SRCALPHA).convert_alpha()
+            self.chunks[key] = chunk
+
+        chunk.blit(surface, (pos[0] - key[0] * self.chunk_size,
+                             pos[1] - key[1] * self.chunk_size))
+
+    def add_layer(self, layer, rect=None):
+        """
+        Adds the tiles of a tilemap.TileLayer, or only those overlapped by a
+        pixel rect.
+        """
+        tile_width, tile_height = layer.tile_width, layer.tile_height
+        for x, y, gid in layer.tiles(rect):
+            self.add_tile((x * tile_width, y * tile_height), layer.image(gid))
+
+    def remove_chunk(self, key):
+        self.chunks.pop(key, None)
+
+    def draw(self, screen, offset):
+        size = self.chunk_size
+        width, height = screen.get_size()
+
+        for y in range(int(offset.y // size), int((offset.y + height) // size) + 1):  # noqa: E501
+            for x in range(int(offset.x // size), int((offset.x + width) // size) + 1):  # noqa: E501
+                chunk = self.chunks.get((x, y))
+                if chunk:
+                    screen.blit(chunk, (x * size, y * size) - offset)
 
 
 class CameraGroup(pygame.sprite.Group):
-    def __init__(self):
+    """
+    Sprite group drawn relative to a camera following a target.
+
+    Members are kept in a spatial hash so drawing only visits sprites
+    overlapping the view, and updating only visits sprites within the view
+    plus ``margin`` pixels. Sprites with a true ``always_update`` attribute
+    (the player, particles) are updated every frame wherever they are.
+    Culled sprites are frozen and receive the whole elapsed time as ``dt``
+    when they are updated again. Sprites with a false ``updates`` attribute
+    (sprites animated by shared tracks) are only drawn, never updated.
+
+    Sprites are drawn and updated in the order they joined the group,
+    sprites with a higher ``draw_layer`` attribute (0 by default) after the
+    others.
+    """
+    def __init__(self, margin=CULL_MARGIN, cull_updates=CULL_UPDATES):
         super().__init__()
 
+        self.margin = margin
+        self.cull_updates = cull_updates
+        self.spatial_hash = SpatialHash()
+        self.update_hash = SpatialHash()
+        self.updating = {}
+        self.draw_order = {}
+        self.order_counter = count()
+        self.always_update = {}
+        self.last_update = {}
+        self.previous_positions = {}
+        self.frame = 0
+        self.elapsed = 0
+
+        self.static_layers = None
+        self.particle_system = None
         self.offset = pygame.math.Vector2()
         self.camera_borders = {'left': 150, 'right': 150, 'top': 0, 'bottom': 0}
 
@@ -17,19 +98,99 @@ class CameraGroup(pygame.sprite.Group):
             GAME_HEIGHT - (self.camera_borders['top'] + self.camera_borders['bottom'])
         )
 
-    def update_target(self, target):
-        if target.rect.left < self.camera_rect.left:
-            self.camera_rect.left = target.rect.left
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+
+        self.draw_order[sprite] = (getattr(sprite, 'draw_layer', 0),
+                                   next(self.order_counter))
+        self.spatial_hash.insert(sprite, sprite.rect)
+        if getattr(sprite, 'updates', True):
+            self.update_hash.insert(sprite, sprite.rect)
+            self.updating[sprite] = None
+        self.last_update[sprite] = (self.frame, self.elapsed)
+        if getattr(sprite, 'always_update', False):
+            self.always_update[sprite] = None
 
-        if target.rect.right > self.camera_rect.right:
-            self.camera_rect.right = target.rect.right
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+
+        self.draw_order.pop(sprite, None)
+        self.spatial_hash.remove(sprite)
+        self.update_hash.remove(sprite)
+        self.updating.pop(sprite, None)
+        self.always_update.pop(sprite, None)
+        self.last_update.pop(sprite, None)
+        self.previous_positions.pop(sprite, None)
+
+    def view_rect(self, margin=0):
+        return pygame.Rect(self.offset.x - margin,
+                           self.offset.y - margin,
+                           GAME_WIDTH + margin * 2,
+                           GAME_HEIGHT + margin * 2)
+
+    def update(self, dt):
+        self.frame += 1
+        self.elapsed += dt
+
+        if self.cull_updates:
+            sprites = self.update_hash.query(self.view_rect(self.margin))
+            sprites.update(self.always_update)
+        else:
+            sprites = self.updating
+
+        for sprite in sorted(sprites, key=self.draw_order.__getitem__):
+            last_frame, last_elapsed = self.last_update[sprite]
+            self.last_update[sprite] = (self.frame, self.elapsed)
+            self.previous_positions[sprite] = pygame.math.Vector2(sprite.rect.topleft)  # noqa: E501
+
+            # sprites waking up from culling catch up on the time they missed
+            if last_frame >= self.frame - 1:
+                sprite.update(dt)
+            else:
+                sprite.update(self.elapsed - last_elapsed)
+
+            # only updated sprites can move, and they might have died
+            if sprite in self.spritedict:
+                self.spatial_hash.move(sprite, sprite.rect)
+                self.update_hash.move(sprite, sprite.rect)
+
+    def interpolated_position(self, sprite, interpolation):
+        """
+        Returns where to draw a sprite between its position before and after
+        the last update. Sprites not updated by the last update are drawn
+        where they are.
+        """
+        if interpolation >= 1 or self.last_update[sprite][0] != self.frame:
+            return sprite.rect.topleft
+
+        previous = self.previous_positions.get(sprite)
+        if previous is None:
+            return sprite.rect.topleft
+
+        return previous.lerp(sprite.rect.topleft, interpolation)
+
+    def update_target(self, target_rect):
+        if target_rect.left < self.camera_rect.left:
+            self.camera_rect.left = target_rect.left
+
+        if target_rect.right > self.camera_rect.right:
+            self.camera_rect.right = target_rect.right
 
         self.offset.x = self.camera_rect.left - self.camera_borders['left']
         self.offset.y = self.camera_rect.top - self.camera_borders['top']
 
-    def custom_draw(self, screen, target):
-        self.update_target(target)
+    def custom_draw(self, screen, target, interpolation=1):
+        target_rect = target.rect.copy()
+        target_rect.topleft = self.interpolated_position(target, interpolation)
+        self.update_target(target_rect)
+
+        if self.static_layers:
+            self.static_layers.draw(screen, self.offset)
+
+        visible = self.spatial_hash.query(self.view_rect())
+        for sprite in sorted(visible, key=self.draw_order.__getitem__):
+            position = self.interpolated_position(sprite, interpolation)
+            screen.blit(sprite.image, position - self.offset)
 
-        for sprite in self.sprites():
-            offset_pos = sprite.rect.topleft - self.offset
-            screen.blit(sprite.image, offset_pos)
+        if self.particle_system is not None:
+            self.particle_system.draw(screen, self.offset, interpolation)
@@ -0,0 +1,131 @@
+import math
+import pygame
+
+from settings import TILE_SIZE
+
+
+class Collider:
+    """
+    Static solid area produced by merge_tiles(). It exposes the same
+    ``rect``/``old_rect`` pair as sprites so actors resolve collisions
+    against it exactly like against a single tile.
+    """
+    def __init__(self, rect):
+        self.rect = rect
+        self.old_rect = rect.copy()
+
+
+def merge_tiles(cells, tile_size=TILE_SIZE):
+    """
+    Greedily merges solid tile cells into a small set of non-overlapping
+    rects covering exactly the same area.
+
+    Cells are visited in row-major order; each unvisited cell is grown to
+    the right as far as the row stays solid, then downwards while the whole
+    span of the next row is solid too.
+
+    :param cells: Iterable of (column, row) tuples of solid tiles.
+    :param int tile_size: Tile size in pixels.
+
+    :returns: The merged areas in pixel coordinates.
+    :rtype: list of pygame.Rect
+
+    **Example:**
+
+    .. code-block:: python
+
+        # a 3x2 block and a single tile become two rects
+        merge_tiles([(0, 0), (1, 0), (2, 0), (0, 1), (1, 1), (2, 1), (5, 0)])
+    """
+    remaining = set(cells)
+    rects = []
+
+    for x, y in sorted(remaining, key=lambda cell: (cell[1], cell[0])):
+        if (x, y) not in remaining:
+            continue
+
+        width = 1
+        while (x + width, y) in remaining:
+            width += 1
+
+        height = 1
+        while all((x + i, y + height) in remaining for i in range(width)):
+            height += 1
+
+        for row in range(y, y + height):
+            for column in range(x, x + width):
+                remaining.discard((column, row))
+
+        rects.append(pygame.Rect(x * tile_size, y * tile_size,
+                                 width * tile_size, height * tile_size))
+
+    return rects
+
+
+class CollisionGrid:
+    """
+    Uniform grid index over static colliders.
+
+    Every collider is registered in each cell its rect overlaps, so finding
+    collision candidates for an actor only looks at the handful of cells
+    around its hitbox instead of scanning every collider of the level.
+
+    Colliders are any objects exposing ``rect`` and ``old_rect``, like
+    Collider.
+    """
+    def __init__(self, cell_size=TILE_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cell_range(self, rect):
+        """
+        Returns the inclusive (left, top, right, bottom) cell coordinates
+        overlapped by a rect. Rect edges lying exactly on a cell border do
+        not count as overlapping the next cell, matching Rect.colliderect.
+        """
+        size = self.cell_size
+        return (int(rect.left // size),
+                int(rect.top // size),
+                math.ceil(rect.right / size) - 1,
+                math.ceil(rect.bottom / size) - 1)
+
+    def add(self, obj):
+        left, top, right, bottom = self.cell_range(obj.rect)
+
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                self.cells.setdefault((x, y), []).append(obj)
+
+    def remove(self, obj):
+        left, top, right, bottom = self.cell_range(obj.rect)
+
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                cell = self.cells.get((x, y))
+                if cell and obj in cell:
+                    cell.remove(obj)
+                    if not cell:
+                        del self.cells[(x, y)]
+
+    def clear(self):
+        self.cells.clear()
+
+    def query(self, rect):
+        """
+        Returns the colliders registered in the cells overlapped by rect, in
+        row-major order and without duplicates. Candidates are not tested
+        against rect, callers do their own precise checks.
+        """
+        left, top, right, bottom = self.cell_range(rect)
+        cells = self.cells
+        found = []
+        seen = set()
+
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                for obj in cells.get((x, y), ()):
+                    if id(obj) not in seen:
+                        seen.add(id(obj))
+                        found.append(obj)
+
+        return found
@@ -0,0 +1,124 @@
+import json
+import random
+import numpy as np
+import pygame
+
+
+# keys whose held state is saved by InputRecorder
+RECORDED_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN,
+                 pygame.K_SPACE, pygame.K_RETURN, pygame.K_ESCAPE)
+
+# event types saved by InputRecorder
+RECORDED_EVENTS = (pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEBUTTONDOWN,
+                   pygame.MOUSEBUTTONUP)
+
+
+class KeyState:
+    """
+    Held keys of a replayed step, indexable like pygame.key.get_pressed().
+    """
+    def __init__(self, keys=()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key):
+        return key in self.keys
+
+
+class KeyboardInput:
+    """
+    Live input: events from the pygame event queue and the real keyboard.
+
+    The Controller calls step() once per simulation step with the events
+    gathered for it, and actors read held keys through pressed().
+    """
+    def step(self, dt, events):
+        return events
+
+    def pressed(self):
+        return pygame.key.get_pressed()
+
+    def close(self):
+        pass
+
+
+class InputRecorder(KeyboardInput):
+    """
+    Live input that also writes every simulation step to a file, so the
+    session can be replayed with InputReplay.
+
+    The file is JSON lines: a header with the random seed, then one line
+    per step with its dt, the held RECORDED_KEYS and the RECORDED_EVENTS.
+    """
+    def __init__(self, path, seed=0):
+        seed_random(seed)
+
+        self.file = open(path, 'w')
+        self.file.write(json.dumps({'version': 1, 'seed': seed}) + '\n')
+
+    def step(self, dt, events):
+        pressed = self.pressed()
+
+        self.file.write(json.dumps({
+            'dt': dt,
+            'keys': [key for key in RECORDED_KEYS if pressed[key]],
+            'events': [serialize_event(event) for event in events
+                       if event.type in RECORDED_EVENTS],
+        }) + '\n')
+
+        return events
+
+    def close(self):
+        self.file.close()
+
+
+class InputReplay:
+    """
+    Input replayed from a file written by InputRecorder. Live events are
+    ignored, each step gets the recorded events and held keys instead.
+    """
+    def __init__(self, path):
+        with open(path) as file:
+            header = json.loads(file.readline())
+            self.steps = [json.loads(line) for line in file if line.strip()]
+
+        seed_random(header['seed'])
+
+        self.index = 0
+        self.keys = KeyState()
+
+    def __len__(self):
+        return len(self.steps)
+
+    @property
+    def finished(self):
+        return self.index >= len(self.steps)
+
+    def next_dt(self):
+        return self.steps[self.index]['dt']
+
+    def step(self, dt, events):
+        recorded = self.steps[self.index]
+        self.index += 1
+
+        self.keys = KeyState(recorded['keys'])
+        return [pygame.event.Event(event['type'], event['dict'])
+                for event in recorded['events']]
+
+    def pressed(self):
+        return self.keys
+
+    def close(self):
+        pass
+
+
+def seed_random(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def serialize_event(event):
+    return {
+        'type': event.type,
+        'dict': {name: value for name, value in event.dict.items()
+                 if isinstance(value, (int, float, str, tuple, list))},
+    }
@@ -1,10 +1,34 @@
 import pygame
 
-from settings import WHITE, BLACK
+from functools import cache
 
+from settings import (WHITE, BLACK, DEBUG_FONT_FILE, DEBUG_FONT_SIZE,
+                      DEBUG_BITMAP_FONT)
+from text import BitmapFont, text_renderer
 
-def debug(message, pos, surface, font):
-    debug_message = font.render(str(message), True, WHITE)
+
+@cache
+def debug_font():
+    # loaded on first use instead of when settings is imported
+    pygame.font.init()
+    return pygame.font.Font(DEBUG_FONT_FILE, DEBUG_FONT_SIZE)
+
+
+@cache
+def debug_bitmap_font():
+    return BitmapFont(debug_font(), WHITE, BLACK)
+
+
+def debug(message, pos, surface, font=None):
+    message = str(message)
+
+    if font is None and DEBUG_BITMAP_FONT:
+        # the glyphs have a black background already
+        debug_bitmap_font().draw(surface, message, pos)
+        return
+
+    debug_message = text_renderer.render(font if font else debug_font(),
+                                         message, WHITE)
     debug_rect = debug_message.get_rect(topleft=pos)
     pygame.draw.rect(surface, BLACK, debug_rect)
     surface.blit(debug_message, debug_rect)
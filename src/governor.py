@@ -0,0 +1,107 @@
+from statistics import median
+
+from settings import (QUALITY_GOVERNOR, QUALITY_FRAME_BUDGET, QUALITY_WINDOW,
+                      QUALITY_RECOVERY, PARTICLE_CAPACITY)
+
+
+class QualityLevel:
+    """
+    Settings of a quality level.
+
+    Attributes:
+        name: Shown by the debug overlay.
+        particle_scale: Factor applied to the number of particles emitted.
+        particle_limit: Maximum number of live particles.
+        skip_unchanged_frames: Frames without a simulation step are not
+                               drawn again.
+    """
+    def __init__(self, name, particle_scale, particle_limit,
+                 skip_unchanged_frames):
+        self.name = name
+        self.particle_scale = particle_scale
+        self.particle_limit = particle_limit
+        self.skip_unchanged_frames = skip_unchanged_frames
+
+
+# best first
+QUALITY_LEVELS = (
+    QualityLevel('high', 1, PARTICLE_CAPACITY, False),
+    QualityLevel('medium', 0.5, PARTICLE_CAPACITY // 4, False),
+    QualityLevel('low', 0.5, PARTICLE_CAPACITY // 20, True),
+    QualityLevel('lowest', 0.25, PARTICLE_CAPACITY // 100, True),
+)
+
+
+class QualityGovernor:
+    """
+    Adjusts the quality level to keep frames within a time budget.
+
+    frame() is given the time the game worked on each frame, without the
+    time spent waiting for the next one. Every ``window`` frames the median
+    of those times is compared to the budget: over it the quality drops a
+    level, under ``recovery`` times the budget it goes back up a level.
+
+    Code owning the knobs subscribes a callback, called with the new
+    QualityLevel whenever it changes.
+    """
+    def __init__(self, levels=QUALITY_LEVELS, budget=QUALITY_FRAME_BUDGET,
+                 window=QUALITY_WINDOW, recovery=QUALITY_RECOVERY,
+                 enabled=QUALITY_GOVERNOR):
+        self.levels = levels
+        self.budget = budget
+        self.window = window
+        self.recovery = recovery
+        self.enabled = enabled
+        self.index = 0
+        self.frames = []
+        self.frame_time = 0
+        self.listeners = []
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    def subscribe(self, callback):
+        """
+        Calls callback with the current level now and with every new level.
+        """
+        self.listeners.append(callback)
+        callback(self.level)
+
+    def unsubscribe(self, callback):
+        self.listeners.remove(callback)
+
+    def frame(self, work_time):
+        if not self.enabled:
+            return
+
+        self.frames.append(work_time)
+        if len(self.frames) < self.window:
+            return
+
+        self.frame_time = median(self.frames)
+        self.frames.clear()
+
+        if self.frame_time > self.budget:
+            self.set_level(self.index + 1)
+        elif self.frame_time < self.budget * self.recovery:
+            self.set_level(self.index - 1)
+
+    def set_level(self, index):
+        index = min(max(index, 0), len(self.levels) - 1)
+        if index == self.index:
+            return
+
+        self.index = index
+        for callback in self.listeners:
+            callback(self.level)
+
+    def status(self):
+        """
+        Text describing the current quality, for the debug overlay.
+        """
+        return (f'quality {self.level.name} '
+                f'({self.frame_time * 1000:.1f}/{self.budget * 1000:.1f}ms)')
+
+
+governor = QualityGovernor()
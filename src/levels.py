@@ -0,0 +1,782 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+import pygame
+import numpy as np
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import perf_counter
+from xml.etree import ElementTree
+
+from settings import (TILED_DIR, LEVEL_CACHE_DIR, MERGE_COLLISION,
+                      CHUNK_TILES, STREAM_MIN_TILES)
+from loaders import load_image, release
+from tracing import tracer
+from collision import merge_tiles
+
+
+FLIPPED_HORIZONTALLY = 0x80000000
+FLIPPED_VERTICALLY = 0x40000000
+FLIPPED_DIAGONALLY = 0x20000000
+GID_MASK = 0x1FFFFFFF
+
+CACHE_MAGIC = b'LVLC'
+CACHE_VERSION = 2
+CACHE_PREAMBLE = struct.Struct('<4sHI')
+
+
+class LevelObject:
+    """
+    Object of a TMX object group. Like pytmx, (x, y) is the top left corner
+    of the object, also for tile objects which Tiled anchors at the bottom.
+    """
+    def __init__(self, name, type, x, y, width, height, gid=0):
+        self.name = name
+        self.type = type
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.gid = gid
+
+    def to_dict(self):
+        return vars(self).copy()
+
+
+class LevelData:
+    """
+    Renderer independent description of a TMX map.
+
+    Tile layers are flat row-major arrays of raw Tiled gids, flip flags
+    included, and object groups are lists of LevelObject. Nothing here
+    touches pygame, tile surfaces are resolved separately by TileImages and
+    layers are drawn and queried through tilemap.TileLayer.
+
+    Attributes:
+        source: Absolute path of the TMX file.
+        width, height: Map size in tiles.
+        tile_width, tile_height: Tile size in pixels.
+        tilesets: Tileset dicts, image paths relative to the TMX directory.
+        layers: Dict of layer name to gid array.
+        object_groups: Dict of object group name to list of LevelObject.
+        infinite: Made of chunks in Tiled. Its chunks are laid out in a
+                  dense map starting at the top left chunk.
+        collision_rects: Merged terrain rects baked by prepare_level(), or
+                         None when they were not computed.
+        chunks: Dict of chunk coordinates to LevelChunk for levels streamed
+                in by chunks, baked by prepare_level(), else None.
+    """
+    def __init__(self, source, width, height, tile_width, tile_height,
+                 tilesets, layers, object_groups, infinite=False):
+        self.source = source
+        self.width = width
+        self.height = height
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.tilesets = tilesets
+        self.layers = layers
+        self.object_groups = object_groups
+        self.infinite = infinite
+        self.collision_rects = None
+        self.chunks = None
+
+    def grid(self, layer):
+        """
+        Returns a (height, width) NumPy view of the gids of a layer, empty
+        for missing layers.
+        """
+        gids = self.layers.get(layer)
+        if gids is None:
+            return np.zeros((self.height, self.width), dtype=np.uint32)
+        return np.frombuffer(gids, dtype=np.uint32).reshape(self.height,
+                                                            self.width)
+
+    def tiles(self, layer):
+        """
+        Returns (x, y, gid) for every non empty cell of a tile layer, in
+        row-major order like pytmx's TiledTileLayer.tiles().
+        """
+        grid = self.grid(layer)
+        rows, columns = np.nonzero(grid)
+        return list(zip(columns.tolist(), rows.tolist(),
+                        grid[rows, columns].tolist()))
+
+    def gid_at(self, layer, x, y):
+        return self.layers[layer][y * self.width + x]
+
+    def objects(self, group):
+        return self.object_groups.get(group, [])
+
+    @property
+    def streamed(self):
+        """
+        Infinite levels and levels of at least STREAM_MIN_TILES cells are
+        streamed in by chunks around the player instead of loaded whole.
+        """
+        return self.infinite or self.width * self.height >= STREAM_MIN_TILES
+
+
+class LevelChunk:
+    """
+    Content of a square area of CHUNK_TILES x CHUNK_TILES tiles of a level,
+    built by index_chunks().
+
+    Tiles are not listed, they are read from the level layers.
+
+    Attributes:
+        objects: (group, index, LevelObject) of the objects anchored in the
+                 chunk, index being the position of the object in its group.
+        collision_rects: Merged terrain rects of the chunk, or None when
+                         they were not computed.
+    """
+    def __init__(self):
+        self.objects = []
+        self.collision_rects = None
+
+
+class TileImages(dict):
+    """
+    Lazily resolved mapping of raw gids to tile surfaces for a level.
+
+    Tileset images are loaded once through the loaders module and sliced
+    on demand, flip flags are applied like pytmx does. release() hands the
+    tileset images back to the asset registry.
+    """
+    def __init__(self, level):
+        super().__init__()
+        self.level = level
+        self.sheets = {}
+
+    def __missing__(self, gid):
+        surface = self.load(gid)
+        self[gid] = surface
+        return surface
+
+    def release(self):
+        for sheet in self.sheets.values():
+            release(sheet)
+        self.sheets.clear()
+        self.clear()
+
+    def tileset(self, gid):
+        found = None
+        for tileset in self.level.tilesets:
+            if tileset['firstgid'] <= gid:
+                if not found or tileset['firstgid'] > found['firstgid']:
+                    found = tileset
+        return found
+
+    def load(self, gid):
+        tile_id = gid & GID_MASK
+        tileset = self.tileset(tile_id)
+
+        image = tileset['image']
+        if image not in self.sheets:
+            path = os.path.join(os.path.dirname(self.level.source), image)
+            self.sheets[image] = load_image(os.path.normpath(path))
+        sheet = self.sheets[image]
+
+        index = tile_id - tileset['firstgid']
+        columns = tileset['columns']
+        width, height = tileset['tile_width'], tileset['tile_height']
+        margin, spacing = tileset['margin'], tileset['spacing']
+        rect = pygame.Rect(margin + (index % columns) * (width + spacing),
+                           margin + (index // columns) * (height + spacing),
+                           width, height)
+        tile = sheet.subsurface(rect)
+
+        if gid & FLIPPED_DIAGONALLY:
+            tile = pygame.transform.flip(pygame.transform.rotate(tile, 270),
+                                         True, False)
+        if gid & (FLIPPED_HORIZONTALLY | FLIPPED_VERTICALLY):
+            tile = pygame.transform.flip(tile,
+                                         bool(gid & FLIPPED_HORIZONTALLY),
+                                         bool(gid & FLIPPED_VERTICALLY))
+
+        if tileset['trans']:
+            tile = tile.convert()
+            tile.set_colorkey(pygame.Color('#' + tileset['trans']))
+
+        return tile
+
+
+def read_layer_data(data_node, count, encoding=None, compression=None):
+    """
+    Decodes the gids of a <data> node, or of a <chunk> node when the
+    encoding and compression of its parent <data> are given.
+    """
+    encoding = encoding or data_node.get('encoding')
+    compression = compression or data_node.get('compression')
+
+    if encoding == 'csv':
+        return array('I', (int(gid) for gid in data_node.text.split(',')))
+
+    if encoding == 'base64':
+        raw = base64.b64decode(data_node.text.strip())
+        if compression == 'zlib':
+            raw = zlib.decompress(raw)
+        elif compression == 'gzip':
+            raw = gzip.decompress(raw)
+        elif compression:
+            raise ValueError(f'Unsupported layer compression: {compression}')
+
+        gids = array('I')
+        gids.frombytes(raw)
+        if sys.byteorder == 'big':
+            gids.byteswap()
+        return gids
+
+    # plain XML <tile gid=""/> elements
+    gids = array('I', (int(tile.get('gid', 0))
+                       for tile in data_node.findall('tile')))
+    gids.extend([0] * (count - len(gids)))
+    return gids
+
+
+def read_tileset(node, directory):
+    """
+    Returns a tileset dict for a <tileset> node, following external .tsx
+    references. Image paths are made relative to the TMX directory.
+
+    :raises ValueError: For image collection tilesets, which have no single
+                        tileset image.
+    """
+    firstgid = int(node.get('firstgid'))
+    tsx_source = node.get('source')
+    image_dir = ''
+
+    if tsx_source:
+        node = ElementTree.parse(os.path.join(directory, tsx_source)).getroot()
+        image_dir = os.path.dirname(tsx_source)
+
+    image_node = node.find('image')
+    if image_node is None:
+        raise ValueError(f'Unsupported image collection tileset: '
+                         f'{node.get("name")}')
+
+    tile_width = int(node.get('tilewidth'))
+    margin = int(node.get('margin', 0))
+    spacing = int(node.get('spacing', 0))
+    columns = int(node.get('columns', 0))
+    if not columns:
+        image_width = int(image_node.get('width'))
+        columns = (image_width - margin * 2 + spacing) // (tile_width + spacing)  # noqa: E501
+
+    return {
+        'firstgid': firstgid,
+        'tsx': tsx_source,
+        'image': os.path.join(image_dir, image_node.get('source')),
+        'trans': image_node.get('trans'),
+        'tile_width': tile_width,
+        'tile_height': int(node.get('tileheight')),
+        'columns': columns,
+        'margin': margin,
+        'spacing': spacing,
+    }
+
+
+@tracer.traced(category='levels', record_args=True)
+def parse_tmx(path):
+    """
+    Parses a TMX file and its external tilesets into a LevelData.
+
+    :raises ValueError: For TMX features the parser does not read, rather
+                        than returning a level missing their data.
+    """
+    root = ElementTree.parse(path).getroot()
+    if root.find('group') is not None:
+        raise ValueError(f'Unsupported layer groups in {path}')
+    directory = os.path.dirname(path)
+    width = int(root.get('width'))
+    height = int(root.get('height'))
+
+    tile_width = int(root.get('tilewidth'))
+    tile_height = int(root.get('tileheight'))
+    infinite = root.get('infinite') == '1'
+
+    tilesets = [read_tileset(node, directory)
+                for node in root.findall('tileset')]
+
+    origin = (0, 0)
+    if infinite:
+        layers, origin, (width, height) = read_chunked_layers(root)
+    else:
+        layers = {}
+        for node in root.findall('layer'):
+            layers[node.get('name')] = read_layer_data(node.find('data'),
+                                                       width * height)
+
+    # objects of infinite maps move with the chunks to the dense map
+    offset_x = origin[0] * tile_width
+    offset_y = origin[1] * tile_height
+
+    object_groups = {}
+    for group in root.findall('objectgroup'):
+        objects = []
+        for node in group.findall('object'):
+            gid = int(node.get('gid', 0))
+            obj_height = float(node.get('height', 0))
+            y = float(node.get('y', 0))
+
+            objects.append(LevelObject(
+                name=node.get('name'),
+                type=node.get('type', node.get('class')),
+                x=float(node.get('x', 0)) - offset_x,
+                y=(y - obj_height if gid else y) - offset_y,
+                width=float(node.get('width', 0)),
+                height=obj_height,
+                gid=gid
+            ))
+        object_groups[group.get('name')] = objects
+
+    return LevelData(source=path,
+                     width=width,
+                     height=height,
+                     tile_width=tile_width,
+                     tile_height=tile_height,
+                     tilesets=tilesets,
+                     layers=layers,
+                     object_groups=object_groups,
+                     infinite=infinite)
+
+
+def read_chunked_layers(root):
+    """
+    Reads the layers of an infinite map, made of <chunk> nodes placed at
+    any tile coordinates, negative ones included, into dense gid arrays
+    covering the bounding box of every chunk.
+
+    :returns: (layers, (left, top) tile of the bounding box, (width, height))
+    """
+    chunks = []
+    for node in root.findall('layer'):
+        data = node.find('data')
+        for chunk in data.findall('chunk'):
+            x, y = int(chunk.get('x')), int(chunk.get('y'))
+            width, height = int(chunk.get('width')), int(chunk.get('height'))
+            gids = read_layer_data(chunk, width * height,
+                                   data.get('encoding'),
+                                   data.get('compression'))
+            chunks.append((node.get('name'), x, y, width, height, gids))
+
+    left = min((chunk[1] for chunk in chunks), default=0)
+    top = min((chunk[2] for chunk in chunks), default=0)
+    right = max((chunk[1] + chunk[3] for chunk in chunks), default=0)
+    bottom = max((chunk[2] + chunk[4] for chunk in chunks), default=0)
+    map_width, map_height = right - left, bottom - top
+
+    layers = {node.get('name'): array('I', bytes(4 * map_width * map_height))
+              for node in root.findall('layer')}
+
+    for name, x, y, width, height, gids in chunks:
+        layer = layers[name]
+        for row in range(height):
+            start = (y - top + row) * map_width + x - left
+            layer[start:start + width] = gids[row * width:(row + 1) * width]
+
+    return layers, (left, top), (map_width, map_height)
+
+
+def source_files(level):
+    directory = os.path.dirname(level.source)
+    files = [os.path.basename(level.source)]
+    files.extend(tileset['tsx'] for tileset in level.tilesets
+                 if tileset['tsx'])
+    return [os.path.normpath(os.path.join(directory, file)) for file in files]
+
+
+def fingerprint(path):
+    stat = os.stat(path)
+    with open(path, 'rb') as file:
+        digest = hashlib.sha1(file.read()).hexdigest()
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': digest}
+
+
+def is_fresh(path, recorded):
+    """
+    Checks a source file against its recorded fingerprint. The content hash
+    is only computed when the modification time or size changed, recorded
+    then gets the new ones when the content is the same.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return False
+
+    if stat.st_mtime_ns == recorded['mtime'] and stat.st_size == recorded['size']:  # noqa: E501
+        return True
+
+    current = fingerprint(path)
+    if current['sha1'] != recorded['sha1']:
+        return False
+
+    recorded.update(current)
+    return True
+
+
+def cache_path(path):
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(LEVEL_CACHE_DIR, f'{name}-{key}.lvl')
+
+
+@tracer.traced(category='levels', record_args=True)
+def write_cache(level, path):
+    """
+    Writes the compiled form of a level: a preamble (magic, format version,
+    header size), a JSON header with the map properties, tilesets, objects
+    and source fingerprints, then the gid array of each layer, stored with
+    2 bytes per cell when every gid of the layer fits.
+    """
+    directory = os.path.dirname(level.source)
+    layers = []
+    blobs = []
+
+    for name, gids in level.layers.items():
+        typecode = 'H' if max(gids, default=0) <= 0xFFFF else 'I'
+        data = array(typecode, gids)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        layers.append({'name': name, 'typecode': typecode})
+        blobs.append(data.tobytes())
+
+    header = json.dumps({
+        'width': level.width,
+        'height': level.height,
+        'tile_width': level.tile_width,
+        'tile_height': level.tile_height,
+        'infinite': level.infinite,
+        'tilesets': level.tilesets,
+        'layers': layers,
+        'object_groups': {name: [obj.to_dict() for obj in objects]
+                          for name, objects in level.object_groups.items()},
+        'sources': {os.path.relpath(file, directory): fingerprint(file)
+                    for file in source_files(level)},
+    }).encode()
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # unique per thread, a prefetch and a direct load may write at once
+    temp_path = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(CACHE_PREAMBLE.pack(CACHE_MAGIC, CACHE_VERSION,
+                                       len(header)))
+        file.write(header)
+        for blob in blobs:
+            file.write(blob)
+    os.replace(temp_path, path)
+
+
+@tracer.traced(category='levels', record_args=True)
+def read_cache(source, path):
+    """
+    Loads a compiled level, or returns None when it is missing, corrupt,
+    written by another format version or older than any of its source
+    files.
+
+    Source files touched without changing are recorded again, so their
+    content is not hashed on every load.
+    """
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+
+    if len(data) < CACHE_PREAMBLE.size:
+        return None
+
+    magic, version, header_size = CACHE_PREAMBLE.unpack_from(data)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        return None
+
+    try:
+        level, touched = decode_cache(source, data, header_size)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    if touched:
+        try:
+            write_cache(level, path)
+        except OSError:
+            pass
+
+    return level
+
+
+def decode_cache(source, data, header_size):
+    """
+    Decodes the header and layers of a compiled level read by read_cache().
+
+    :returns: (the level or None when a source file changed, whether a
+              source file was touched without changing)
+    """
+    offset = CACHE_PREAMBLE.size
+    header = json.loads(data[offset:offset + header_size])
+    offset += header_size
+
+    directory = os.path.dirname(source)
+    sources = header['sources']
+    recorded_stats = [(recorded['mtime'], recorded['size'])
+                      for recorded in sources.values()]
+    for file, recorded in sources.items():
+        if not is_fresh(os.path.join(directory, file), recorded):
+            return None, False
+    touched = recorded_stats != [(recorded['mtime'], recorded['size'])
+                                 for recorded in sources.values()]
+
+    count = header['width'] * header['height']
+    layers = {}
+    for layer in header['layers']:
+        gids = array(layer['typecode'])
+        size = count * gids.itemsize
+        gids.frombytes(data[offset:offset + size])
+        if len(gids) != count:
+            raise ValueError(f'Truncated layer: {layer["name"]}')
+        if sys.byteorder == 'big':
+            gids.byteswap()
+        layers[layer['name']] = array('I', gids)
+        offset += size
+
+    object_groups = {name: [LevelObject(**obj) for obj in objects]
+                     for name, objects in header['object_groups'].items()}
+
+    level = LevelData(source=source,
+                      width=header['width'],
+                      height=header['height'],
+                      tile_width=header['tile_width'],
+                      tile_height=header['tile_height'],
+                      tilesets=header['tilesets'],
+                      layers=layers,
+                      object_groups=object_groups,
+                      infinite=header['infinite'])
+    return level, touched
+
+
+@tracer.traced(category='levels', record_args=True)
+def load_level(filename, use_cache=True):
+    """
+    Loads a TMX map as LevelData, going through the compiled level cache.
+
+    The compiled file is rebuilt automatically whenever the TMX file or one
+    of its external tilesets changed.
+
+    :param str filename: The TMX file path, relative to settings.TILED_DIR
+    :param bool use_cache: Read and write the compiled level cache.
+
+    :returns: The parsed level.
+    :rtype: LevelData
+
+    **Example:**
+
+    .. code-block:: python
+
+        level = load_level('example_levels/testing-1.tmx')
+        tile_images = TileImages(level)
+    """
+    source = os.path.abspath(os.path.join(TILED_DIR, filename))
+
+    if use_cache:
+        level = read_cache(source, cache_path(source))
+        if level:
+            return level
+
+    level = parse_tmx(source)
+
+    if use_cache:
+        try:
+            write_cache(level, cache_path(source))
+        except OSError:
+            pass
+
+    return level
+
+
+@tracer.traced(category='levels', record_args=True)
+def prepare_level(filename, merge_collision=MERGE_COLLISION):
+    """
+    Loads a level and bakes the work that does not need the main thread,
+    leaving only sprite and surface creation to PlatformerGame.load_map.
+    Streamed levels get their chunk index instead of whole level collision
+    rects.
+    """
+    level = load_level(filename)
+
+    if level.streamed:
+        level.chunks = index_chunks(level, merge_collision=merge_collision)
+    elif merge_collision:
+        level.collision_rects = merge_tiles(
+            [(x, y) for x, y, _ in level.tiles('terrain')])
+
+    return level
+
+
+def index_chunks(level, chunk_tiles=CHUNK_TILES,
+                 merge_collision=MERGE_COLLISION):
+    """
+    Finds the chunks of chunk_tiles x chunk_tiles tiles of a level having
+    tiles or animated_bg and items objects, and sorts the objects into
+    them. Returns LevelChunk keyed by chunk (x, y), chunks without any
+    content are left out. The checkpoint is not part of any chunk, it is
+    always loaded.
+
+    With merge_collision the terrain of each chunk is merged on its own,
+    so collision rects never cross chunk borders and are loaded and
+    unloaded with their chunk.
+    """
+    chunks = {}
+
+    def chunk_at(x, y):
+        key = (x // chunk_tiles, y // chunk_tiles)
+        chunk = chunks.get(key)
+        if chunk is None:
+            chunk = chunks[key] = LevelChunk()
+        return chunk
+
+    # chunks holding tiles of any layer
+    columns = -(-level.width // chunk_tiles)
+    for layer in ('terrain', 'background', 'foreground'):
+        rows, cells = np.nonzero(level.grid(layer))
+        keys = np.unique(rows // chunk_tiles * columns + cells // chunk_tiles)
+        for key in keys.tolist():
+            chunk_at(key % columns * chunk_tiles,
+                     key // columns * chunk_tiles)
+
+    for group in ('animated_bg', 'items'):
+        for index, obj in enumerate(level.objects(group)):
+            if obj.name != 'checkpoint':
+                chunk_at(int(obj.x // level.tile_width),
+                         int(obj.y // level.tile_height)).objects.append(
+                             (group, index, obj))
+
+    if merge_collision:
+        terrain = level.grid('terrain')
+        for (x, y), chunk in chunks.items():
+            left, top = x * chunk_tiles, y * chunk_tiles
+            rows, cells = np.nonzero(terrain[top:top + chunk_tiles,
+                                             left:left + chunk_tiles])
+            chunk.collision_rects = merge_tiles(
+                zip((cells + left).tolist(), (rows + top).tolist()))
+
+    return chunks
+
+
+class LevelPrefetcher:
+    """
+    Prepares levels in a background thread before they are needed.
+
+    get() hands over a prefetch, waiting for it when it is in progress, or
+    prepares the level on the calling thread when it was not requested or
+    has not started yet.
+    """
+    def __init__(self, enabled=True):
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix='prefetch')
+        self.enabled = enabled
+        self.pending = {}
+
+    def prefetch(self, filename):
+        if self.enabled and filename not in self.pending:
+            self.pending[filename] = self.executor.submit(prepare_level,
+                                                          filename)
+
+    def get(self, filename):
+        future = self.pending.pop(filename, None)
+
+        # cancel() fails once the prefetch has started, waiting for it is
+        # quicker than preparing the level a second time
+        if future and not future.cancel() and not future.exception():
+            return future.result()
+
+        return prepare_level(filename)
+
+    def cancel(self):
+        """
+        Drops every prefetch, waiting for the ones already started.
+        """
+        for future in self.pending.values():
+            future.cancel()
+        wait(self.pending.values())
+        self.pending.clear()
+
+
+def tmx_files(directory=TILED_DIR):
+    for folder_path, _, file_list in os.walk(directory):
+        for filename in sorted(file_list):
+            if filename.endswith('.tmx'):
+                yield os.path.relpath(os.path.join(folder_path, filename),
+                                      directory)
+
+
+def compile_levels():
+    for filename in tmx_files():
+        source = os.path.join(TILED_DIR, filename)
+        try:
+            level = parse_tmx(source)
+        except (OSError, ValueError, ElementTree.ParseError) as error:
+            print(f'skipped {filename}: {error}')
+            continue
+
+        write_cache(level, cache_path(source))
+        print(f'compiled {filename}')
+
+
+def compare_load_times(repeat=10):
+    """
+    Prints the average time to get a level with its tile surfaces ready,
+    using pytmx on the TMX file versus the compiled level cache.
+    """
+    import loaders
+    from pytmx.util_pygame import load_pygame
+
+    pygame.display.set_mode((1, 1), pygame.HIDDEN)
+    # pytmx decodes the tilesets on every load, so does the cache path
+    loaders.baked = None
+
+    def cached(filename):
+        level = load_level(filename)
+        tile_images = TileImages(level)
+        for layer in level.layers:
+            for _, _, gid in level.tiles(layer):
+                tile_images[gid]
+        tile_images.release()
+        loaders.registry.clear()
+
+    print(f'{"level":<40} {"pytmx":>10} {"cache":>10} {"speedup":>8}')
+    for filename in tmx_files():
+        try:
+            load_level(filename)
+        except (OSError, ValueError, ElementTree.ParseError) as error:
+            print(f'{filename:<40} skipped: {error}')
+            continue
+
+        timings = []
+        for load in (lambda: load_pygame(os.path.join(TILED_DIR, filename)),
+                     lambda: cached(filename)):
+            start = perf_counter()
+            for _ in range(repeat):
+                load()
+            timings.append((perf_counter() - start) / repeat * 1000)
+
+        print(f'{filename:<40} {timings[0]:>8.2f}ms {timings[1]:>8.2f}ms '
+              f'{timings[0] / timings[1]:>7.1f}x')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Compiled level cache.')
+    parser.add_argument('command', choices=('compile', 'compare'))
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == 'compile':
+        compile_levels()
+    else:
+        compare_load_times(args.repeat)
@@ -1,11 +1,341 @@
+import json
+import mmap
 import pygame
 
-from os import walk
-from os.path import join
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+from os import walk, stat
+from os.path import join, normpath, relpath
 
-from settings import GRAPHICS_DIR
+from settings import (GRAPHICS_DIR, ASSET_MEMORY_LIMIT, BAKED_ASSETS_DIR,
+                      USE_BAKED_ASSETS)
+from tracing import tracer
 
 
+# format of the index written by bake.py
+BAKE_VERSION = 1
+
+
+class AssetRegistry:
+    """
+    Deduplicating cache of every asset produced by the loaders.
+
+    Assets are stored by key (kind, path and slice spec) so loading the same
+    image, sheet slice or folder twice returns the same objects without
+    touching the disk again. Each load adds a reference to the asset and
+    release() drops one. Unreferenced assets stay cached for later loads,
+    but once the cached surfaces use more than ``memory_limit`` bytes the
+    least recently used unreferenced ones are evicted. A memory_limit of
+    None never evicts.
+
+    Attributes:
+        assets: Cached assets by key, least recently used first.
+        references: Reference count by key.
+        dependencies: Keys of the assets each cached asset holds a
+                      reference to, like the sheet of a list of frames.
+        disk_reads: Number of image files decoded so far.
+    """
+    def __init__(self, memory_limit=ASSET_MEMORY_LIMIT):
+        self.memory_limit = memory_limit
+        self.assets = OrderedDict()
+        self.references = {}
+        self.dependencies = {}
+        self.sizes = {}
+        self.keys = {}
+        self.memory = 0
+        self.disk_reads = 0
+
+    def __contains__(self, key):
+        return key in self.assets
+
+    def get(self, key, load):
+        """
+        Returns the asset cached under key with a new reference to it,
+        calling load() to create it when missing. load() returns the asset
+        and the keys of the assets it acquired a reference to.
+        """
+        if key in self.assets:
+            self.assets.move_to_end(key)
+            self.references[key] += 1
+            return self.assets[key]
+
+        asset, dependencies = load()
+
+        self.assets[key] = asset
+        self.references[key] = 1
+        self.dependencies[key] = dependencies
+        self.sizes[key] = surface_bytes(asset)
+        self.keys[id(asset)] = key
+        self.memory += self.sizes[key]
+
+        self.evict()
+        return asset
+
+    def release(self, asset):
+        """
+        Drops a reference to an asset returned by one of the loaders.
+        """
+        key = self.keys.get(id(asset))
+        if key is None or not self.references.get(key):
+            return
+
+        self.references[key] -= 1
+        self.evict()
+
+    def evict(self):
+        if self.memory_limit is None:
+            return
+
+        for key in list(self.assets):
+            if self.memory <= self.memory_limit:
+                break
+            # discarding releases dependencies, which may evict others
+            if key in self.assets and not self.references[key]:
+                self.discard(key)
+
+    def discard(self, key):
+        asset = self.assets.pop(key)
+        del self.references[key]
+        del self.keys[id(asset)]
+        self.memory -= self.sizes.pop(key)
+
+        for dependency in self.dependencies.pop(key):
+            self.release(self.assets[dependency])
+
+    def clear(self):
+        self.assets.clear()
+        self.references.clear()
+        self.dependencies.clear()
+        self.sizes.clear()
+        self.keys.clear()
+        self.memory = 0
+
+
+def surface_bytes(asset):
+    """
+    Memory used by the pixels an asset owns. Subsurfaces share the pixels
+    of their parent and count as zero.
+    """
+    if isinstance(asset, pygame.Surface):
+        if asset.get_parent() is not None:
+            return 0
+        return asset.get_width() * asset.get_height() * asset.get_bytesize()
+
+    return 0
+
+
+registry = AssetRegistry()
+
+
+def release(asset):
+    """
+    Releases an asset returned by load_image, load_sprite_sheet,
+    load_sprite_sheet_folder or load_image_folder, letting the registry
+    evict it when memory is needed.
+    """
+    registry.release(asset)
+
+
+def index_path(directory):
+    return join(directory, 'index.json')
+
+
+def page_path(directory, number):
+    return join(directory, f'page-{number}.bgra')
+
+
+def source_stat(path):
+    info = stat(path)
+    return [info.st_mtime_ns, info.st_size]
+
+
+class BakedAssets:
+    """
+    Images baked by bake.py: atlas pages of raw BGRA pixels and an index of
+    where every source image, and the frames of the sheets listed in the
+    asset manifest, are in the pages.
+
+    Pages are memory-mapped and wrapped into surfaces without decoding or
+    copying, images and frames are subsurfaces of them. Images changed
+    since they were baked, or missing from the bake, are not found and are
+    decoded from their file as usual.
+    """
+    def __init__(self, directory=BAKED_ASSETS_DIR):
+        self.directory = directory
+        self.index = None
+        self.pages = {}
+        self.maps = {}
+
+    def load_index(self):
+        try:
+            with open(index_path(self.directory)) as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            index = None
+
+        if not index or index.get('version') != BAKE_VERSION:
+            index = {'pages': [], 'images': {}}
+        self.index = index
+
+    def entry(self, full_path):
+        if self.index is None:
+            self.load_index()
+
+        entry = self.index['images'].get(relpath(full_path, GRAPHICS_DIR))
+        if entry is None:
+            return None
+
+        try:
+            if source_stat(full_path) != entry['stat']:
+                return None
+        except OSError:
+            return None
+
+        return entry
+
+    def page(self, number):
+        """
+        Returns a page as a surface, None when its file is missing or does
+        not match the size in the index.
+        """
+        page = self.pages.get(number)
+        if page is None:
+            size = self.index['pages'][number]
+            try:
+                with open(page_path(self.directory, number), 'rb') as file:
+                    # copy on write, surfaces need a writable buffer
+                    pixels = mmap.mmap(file.fileno(), 0,
+                                       access=mmap.ACCESS_COPY)
+                page = pygame.image.frombuffer(pixels, size, 'BGRA')
+            except (OSError, ValueError):
+                return None
+            self.maps[number] = pixels
+            self.pages[number] = page
+        return page
+
+    def image(self, full_path):
+        """
+        Returns a baked image, None when it was not baked.
+        """
+        entry = self.entry(full_path)
+        if entry is None:
+            return None
+
+        page = self.page(entry['page'])
+        if page is None:
+            return None
+
+        return page.subsurface(entry['rect'])
+
+    def frames(self, full_path, sprite_dimensions, positions):
+        """
+        Returns the frames of a baked sheet like slice_sprite_sheet(), None
+        when it was not baked in frames of sprite_dimensions.
+        """
+        entry = self.entry(full_path)
+        if (entry is None or entry['frame_size'] is None
+                or tuple(entry['frame_size']) != tuple(sprite_dimensions)):
+            return None
+
+        width, height = sprite_dimensions
+        frames = entry['frames']
+        if positions:
+            # the frame rects of slice_sprite_sheet()
+            columns = entry['rect'][2] // width
+            cells = []
+            for row, column in positions:
+                x, y = column * height, row * width
+                if x % width or y % height:
+                    return None
+                cells.append(y // height * columns + x // width)
+            frames = [frames[cell] for cell in cells]
+
+        page = self.page(entry['page'])
+        if page is None:
+            return None
+
+        return [page.subsurface((x, y, width, height)) for x, y in frames]
+
+
+baked = BakedAssets() if USE_BAKED_ASSETS else None
+
+
+class TransformCache:
+    """
+    Memoized flipped, scaled and rotated variants of surfaces.
+
+    Variants are stored per source surface in a weak mapping, so they go
+    away together with the source, e.g. when the asset registry evicts a
+    sheet. Asking twice for the same variant returns the same surface.
+    """
+    def __init__(self):
+        self.variants = WeakKeyDictionary()
+
+    def __len__(self):
+        return sum(len(variants) for variants in self.variants.values())
+
+    def get(self, surface, key, transform):
+        variants = self.variants.setdefault(surface, {})
+
+        variant = variants.get(key)
+        if variant is None:
+            variant = variants[key] = transform()
+
+        return variant
+
+    def flip(self, surface, flip_x, flip_y):
+        return self.get(surface, ('flip', flip_x, flip_y),
+                        lambda: pygame.transform.flip(surface, flip_x, flip_y))  # noqa: E501
+
+    def scale(self, surface, size):
+        size = tuple(size)
+        return self.get(surface, ('scale', size),
+                        lambda: pygame.transform.scale(surface, size))
+
+    def rotate(self, surface, angle):
+        return self.get(surface, ('rotate', angle),
+                        lambda: pygame.transform.rotate(surface, angle))
+
+
+transforms = TransformCache()
+
+
+def flip_frames(frames, flip_x=True, flip_y=False):
+    """
+    Returns the cached flipped variants of a list of animation frames.
+
+    >>> walking_right = flip_frames(walking_left)
+    """
+    return [transforms.flip(frame, flip_x, flip_y) for frame in frames]
+
+
+def scale_frames(frames, size):
+    """
+    Returns the cached variants of a list of frames scaled to size.
+    """
+    return [transforms.scale(frame, size) for frame in frames]
+
+
+def rotate_frames(frames, angle):
+    """
+    Returns the cached variants of a list of frames rotated by angle
+    degrees counterclockwise.
+    """
+    return [transforms.rotate(frame, angle) for frame in frames]
+
+
+@tracer.traced(category='assets', record_args=True)
+def decode_image(full_path):
+    if baked is not None:
+        image = baked.image(full_path)
+        if image is not None:
+            return image, []
+
+    registry.disk_reads += 1
+    return pygame.image.load(full_path).convert_alpha(), []
+
+
+@tracer.traced(category='assets', record_args=True)
 def load_image(*path):
     """
     Loads an image file and converts it for optimal use with Pygame.
@@ -17,18 +347,21 @@ def load_image(*path):
 
     :raises pygame.error: If the image file could not be loaded.
 
+    Images are cached by the asset registry, loading the same path again
+    returns the same surface, release it with release().
+
     **Example:**
 
     .. code-block:: python
 
         image = load_image('path/to/image.png')
     """ # noqa 
-    full_path = join(GRAPHICS_DIR, *path)
-    image = pygame.image.load(full_path).convert_alpha()
+    full_path = normpath(join(GRAPHICS_DIR, *path))
 
-    return image
+    return registry.get(('image', full_path), lambda: decode_image(full_path))
 
 
+@tracer.traced(category='assets', record_args=True)
 def load_sprite_sheet(file, sprite_dimensions, positions=None):
     """
     This function loads a sprite sheet image and extracts individual sprites
@@ -48,7 +381,9 @@ def load_sprite_sheet(file, sprite_dimensions, positions=None):
     -------
 
     list of pygame.Surface: A list of surfaces, each representing an extracted
-                            sprite.
+                            sprite. The list is shared through the asset
+                            registry and must not be modified, release it
+                            with release().
 
     Examples
     --------
@@ -63,8 +398,22 @@ def load_sprite_sheet(file, sprite_dimensions, positions=None):
                                     (24, 24),
                                     [(1,2), (1,3)])
     """
-    full_path = join(GRAPHICS_DIR, file)
-    sprite_sheet = pygame.image.load(full_path).convert_alpha()
+    full_path = normpath(join(GRAPHICS_DIR, file))
+    key = ('frames', full_path, tuple(sprite_dimensions),
+           tuple(map(tuple, positions)) if positions else None)
+
+    return registry.get(key, lambda: slice_sprite_sheet(full_path,
+                                                        sprite_dimensions,
+                                                        positions))
+
+
+def slice_sprite_sheet(full_path, sprite_dimensions, positions):
+    if baked is not None:
+        sprites = baked.frames(full_path, sprite_dimensions, positions)
+        if sprites is not None:
+            return sprites, []
+
+    sprite_sheet = load_image(full_path)
     sheet_width, sheet_height = sprite_sheet.get_size()
 
     sprites = []
@@ -86,9 +435,11 @@ def load_sprite_sheet(file, sprite_dimensions, positions=None):
                 sprite = sprite_sheet.subsurface(rect)
                 sprites.append(sprite)
 
-    return sprites
+    # the frames hold a reference to their sheet while they are cached
+    return sprites, [('image', full_path)]
 
 
+@tracer.traced(category='assets', record_args=True)
 def load_sprite_sheet_folder(path, sprite_dimensions):
     """
     Load every file in a folder and extracts individual sprites.
@@ -113,18 +464,27 @@ def load_sprite_sheet_folder(path, sprite_dimensions):
         "walk": [s1, s2, sN]
     }
     """
-    sprites_dict = {}
+    full_path = normpath(join(GRAPHICS_DIR, path))
+    key = ('sheet_folder', full_path, tuple(sprite_dimensions))
+
+    def load():
+        sprites_dict = {}
+        dependencies = []
 
-    for folder_path, _, file_list in walk(join(GRAPHICS_DIR, path)):
-        for filename in file_list:
-            full_path = join(folder_path, filename)
+        for folder_path, _, file_list in walk(full_path):
+            for filename in file_list:
+                file_path = join(folder_path, filename)
 
-            frames = load_sprite_sheet(full_path, sprite_dimensions)
-            sprites_dict[filename.split('.')[0]] = frames
+                frames = load_sprite_sheet(file_path, sprite_dimensions)
+                sprites_dict[filename.split('.')[0]] = frames
+                dependencies.append(registry.keys[id(frames)])
 
-    return sprites_dict
+        return sprites_dict, dependencies
 
+    return registry.get(key, load)
 
+
+@tracer.traced(category='assets', record_args=True)
 def load_image_folder(*path):
     """
     Load every file in a folder as a image.
@@ -149,12 +509,19 @@ def load_image_folder(*path):
         "dirty": s1
     }
     """
-    images_dict = {}
+    full_path = normpath(join(GRAPHICS_DIR, *path))
+    key = ('image_folder', full_path)
+
+    def load():
+        images_dict = {}
+        dependencies = []
+
+        for folder_path, _, file_list in walk(full_path):
+            for filename in file_list:
+                surface = load_image(folder_path, filename)
+                images_dict[filename.split('.')[0]] = surface
+                dependencies.append(registry.keys[id(surface)])
 
-    for folder_path, _, file_list in walk(join(GRAPHICS_DIR, *path)):
-        for filename in file_list:
-            full_path = join(folder_path, filename)
-            surface = pygame.image.load(full_path).convert_alpha()
-            images_dict[filename.split('.')[0]] = surface
+        return images_dict, dependencies
 
-    return images_dict
+    return registry.get(key, load)
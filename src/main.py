@@ -1,9 +1,28 @@
-import sys
-import pygame
+from time import perf_counter
 
-from settings import SCREEN_WIDTH, SCREEN_HEIGHT, GAME_WIDTH, GAME_HEIGHT
-from states import Controller, SplashScreen, ExitScreen
-from platformer import PlatformerGame
+# the startup report counts from before the game modules are imported
+STARTED = perf_counter()
+
+import os  # noqa: E402
+import json  # noqa: E402
+import pygame  # noqa: E402
+
+from settings import (SCREEN_WIDTH, SCREEN_HEIGHT, GAME_WIDTH, GAME_HEIGHT,  # noqa: E402, E501
+                      FPS, FIXED_TIMESTEP, SIMULATION_RATE,
+                      MAX_SIMULATION_STEPS, SCALED_DISPLAY)
+from states import Controller, SplashScreen, ExitScreen  # noqa: E402
+from controls import InputRecorder, InputReplay  # noqa: E402
+from profiler import profiler  # noqa: E402
+from governor import governor  # noqa: E402
+
+IMPORTED = perf_counter()
+
+
+def platformer_game(controller):
+    # the platformer brings in the level, sprite and particle modules, they
+    # are imported when the game is first entered
+    from platformer import PlatformerGame
+    return PlatformerGame(controller=controller)
 
 
 class Game():
@@ -13,64 +32,295 @@ class Game():
     Attributes:
         screen: The main display surface.
         canvas: The surface where the game is drawn before scaling to the screen.
+        scaled_display: The display scales the canvas, which is the screen itself.
         clock: The game clock for controlling the frame rate.
         running: A flag to indicate if the game is running or not.
         controller: The game state controller managing the different game states.
+        fixed_timestep: Run the simulation in fixed steps of timestep seconds.
+        accumulator: Frame time not yet consumed by simulation steps.
+        pending_events: Events waiting for the next simulation step.
+        frame_count: Number of frames run so far.
+        started, initialized, first_frame: perf_counter() at the start and
+            end of __init__ and when the first frame was presented.
     """ # noqa
-    def __init__(self):
+    def __init__(self, controls=None):
         """
         Initializes the game, sets up the display and prepare the game states.
+
+        Args:
+            controls: Input source, the live keyboard when None.
         """
+        self.started = perf_counter()
+        self.first_frame = None
+        self.frame_count = 0
+
         pygame.init()
         pygame.display.set_caption("The Mini Games Project")
 
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-        self.canvas = pygame.Surface((GAME_WIDTH, GAME_HEIGHT))
+        self.scaled_display = SCALED_DISPLAY
+        if self.scaled_display:
+            # the display scales the screen itself, the game draws on it;
+            # video drivers without a renderer fall back to SCALE
+            try:
+                self.screen = pygame.display.set_mode(
+                    (GAME_WIDTH, GAME_HEIGHT), pygame.SCALED)
+                self.canvas = self.screen
+            except pygame.error:
+                self.scaled_display = False
+
+        if not self.scaled_display:
+            self.screen = pygame.display.set_mode((SCREEN_WIDTH,
+                                                   SCREEN_HEIGHT))
+            self.canvas = pygame.Surface((GAME_WIDTH, GAME_HEIGHT))
+
         self.clock = pygame.time.Clock()
 
-        self.controller = Controller()
-        self.controller.add_state('SplashScreen',
-                                  SplashScreen(controller=self.controller))
-        self.controller.add_state('ExitScreen',
-                                  ExitScreen(controller=self.controller))
-        self.controller.add_state('PlatformerGame',
-                                  PlatformerGame(controller=self.controller))
+        # states are created when they are first entered
+        self.controller = Controller(controls)
+        self.controller.add_state_factory('SplashScreen', SplashScreen)
+        self.controller.add_state_factory('ExitScreen', ExitScreen)
+        self.controller.add_state_factory('PlatformerGame', platformer_game)
 
         self.controller.change_state('PlatformerGame')
         self.running = True
 
-    def run(self):
+        self.fixed_timestep = FIXED_TIMESTEP
+        self.timestep = 1 / SIMULATION_RATE
+        self.accumulator = 0
+        self.pending_events = []
+
+        self.initialized = perf_counter()
+
+    def run(self, frames=None):
         """
         Starts the game loop, get events, update current state and render
-        the game window.
+        the game window. Stops after frames frames when given.
         """
         while self.running:
-            dt = self.clock.tick(30) / 1000
+            dt = self.clock.tick(FPS) / 1000
+            frame_start = perf_counter()
 
             if self.controller.exit:
                 self.running = False
                 continue
 
-            events = pygame.event.get()
-            for event in events:
-                if event.type == pygame.QUIT:
-                    self.running = False
-                    continue
+            profiler.end_frame()
 
-            self.controller.update(dt, events)
-            self.controller.draw(self.canvas)
+            with profiler.phase('events'):
+                events = pygame.event.get()
+                for event in events:
+                    if event.type == pygame.QUIT:
+                        self.running = False
+                        continue
 
-            self.screen.blit(
-                pygame.transform.scale(self.canvas, (SCREEN_WIDTH,
-                                                     SCREEN_HEIGHT)),
-                (0, 0)
-            )
-            pygame.display.flip()
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:  # noqa: E501
+                        profiler.toggle()
+                        self.controller.invalidate()
+
+                    if event.type == pygame.WINDOWEXPOSED:
+                        self.controller.invalidate()
+
+            with profiler.phase('update'):
+                if self.fixed_timestep:
+                    steps = self.fixed_update(dt, events)
+                else:
+                    self.controller.update(dt, events)
+                    steps = 1
+
+            # the overlay changes every frame, so it keeps states redrawing
+            if profiler.enabled:
+                self.controller.invalidate()
+
+            # at low quality, frames without a simulation step would only
+            # interpolate sprites between the same two steps and are skipped
+            changed = steps or not governor.level.skip_unchanged_frames
+            with profiler.phase('draw'):
+                drawn = self.controller.draw(self.canvas, changed)
 
+            # skipped frames are cheap and would hide the cost of the others
+            if drawn:
+                profiler.draw(self.canvas)
+                self.present()
+                governor.frame(perf_counter() - frame_start)
+
+            self.frame_count += 1
+            if frames is not None and self.frame_count >= frames:
+                self.running = False
+
+        self.controller.controls.close()
         pygame.quit()
-        sys.exit()
+
+    def present(self):
+        """
+        Shows the canvas on the display. The canvas is scaled straight into
+        the display surface, without allocating an intermediate surface.
+        """
+        if not self.scaled_display:
+            with profiler.phase('scale'):
+                pygame.transform.scale(self.canvas, self.screen.get_size(),
+                                       self.screen)
+
+        with profiler.phase('flip'):
+            pygame.display.flip()
+
+        if self.first_frame is None:
+            self.first_frame = perf_counter()
+
+    def startup_report(self):
+        """
+        Returns the time spent importing the game modules, initializing the
+        game and getting its first frame on screen, and their total, in
+        milliseconds. The first frame is None until it is presented.
+        """
+        report = {
+            'import': (IMPORTED - STARTED) * 1000,
+            'init': (self.initialized - self.started) * 1000,
+            'first_frame': None,
+            'total': None,
+        }
+
+        if self.first_frame is not None:
+            report['first_frame'] = (self.first_frame - self.initialized) * 1000  # noqa: E501
+            report['total'] = (self.first_frame - STARTED) * 1000
+
+        return report
+
+    def run_replay(self):
+        """
+        Replays every recorded step as fast as possible, one update and one
+        draw per step with the recorded dt, and returns the time spent in
+        each phase of every frame, in seconds.
+        """
+        controls = self.controller.controls
+        timings = {'update': [], 'draw': [], 'present': []}
+
+        while not controls.finished and not self.controller.exit:
+            start = perf_counter()
+            self.controller.update(controls.next_dt(), [])
+            updated = perf_counter()
+            if self.controller.draw(self.canvas):
+                drawn = perf_counter()
+                self.present()
+            else:
+                drawn = perf_counter()
+            presented = perf_counter()
+
+            timings['update'].append(updated - start)
+            timings['draw'].append(drawn - updated)
+            timings['present'].append(presented - drawn)
+            self.frame_count += 1
+
+        return timings
+
+    def fixed_update(self, frame_time, events):
+        """
+        Advances the simulation by as many fixed steps as the elapsed frame
+        time allows and stores the leftover fraction of a step as the
+        controller interpolation. Events are kept until a step consumes
+        them. When the simulation falls more than MAX_SIMULATION_STEPS
+        behind, the backlog is dropped instead of trying to catch up.
+        Returns the number of steps run.
+        """
+        self.accumulator += frame_time
+        self.pending_events.extend(events)
+
+        steps = 0
+        while self.accumulator >= self.timestep:
+            if steps == MAX_SIMULATION_STEPS:
+                self.accumulator = 0
+                break
+
+            self.controller.update(self.timestep, self.pending_events)
+            self.pending_events = []
+            self.accumulator -= self.timestep
+            steps += 1
+
+        self.controller.interpolation = self.accumulator / self.timestep
+        return steps
+
+
+def summarize(values):
+    """
+    Returns the mean, 95th percentile and maximum of durations in seconds,
+    in milliseconds.
+    """
+    if not values:
+        return {'mean': 0, 'p95': 0, 'max': 0}
+
+    ordered = sorted(values)
+    return {
+        'mean': sum(values) / len(values) * 1000,
+        'p95': ordered[int(len(ordered) * 0.95)] * 1000,
+        'max': ordered[-1] * 1000,
+    }
+
+
+def timing_report(timings):
+    """
+    Summarizes per-frame timings for each phase and for the whole frame.
+    """
+    phases = dict(timings)
+    phases['frame'] = [sum(frame) for frame in zip(*timings.values())]
+
+    report = {phase: summarize(values) for phase, values in phases.items()}
+    report['frames'] = len(phases['frame'])
+
+    return report
+
+
+def print_startup_report(report):
+    print('startup  ' + '  '.join(
+        f'{phase.replace("_", " ")} {value:.1f}ms'
+        for phase, value in report.items() if value is not None))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='The Mini Games Project')
+    parser.add_argument('--record', metavar='FILE',
+                        help='record the input of this session to FILE')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='replay a recorded session and report timings')
+    parser.add_argument('--headless', action='store_true',
+                        help='run without a window (SDL dummy video driver)')
+    parser.add_argument('--report', metavar='FILE',
+                        help='write the replay timings as JSON to FILE')
+    parser.add_argument('--startup', action='store_true',
+                        help='quit after the first frame and report the '
+                             'startup timings')
+    args = parser.parse_args()
+
+    if args.headless:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+    if not args.replay:
+        controls = InputRecorder(args.record) if args.record else None
+        game = Game(controls)
+        game.run(frames=1 if args.startup else None)
+
+        if args.startup:
+            print_startup_report(game.startup_report())
+        return
+
+    game = Game(InputReplay(args.replay))
+    timings = game.run_replay()
+    report = timing_report(timings)
+    pygame.quit()
+
+    print_startup_report(game.startup_report())
+    print(f'{report["frames"]} frames')
+    for phase in ('update', 'draw', 'present', 'frame'):
+        stats = report[phase]
+        print(f'{phase:<8} mean {stats["mean"]:7.3f}ms  '
+              f'p95 {stats["p95"]:7.3f}ms  max {stats["max"]:7.3f}ms')
+
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump({'summary': report, 'startup': game.startup_report(),
+                       'frames': timings}, file, indent=2)
 
 
 if __name__ == '__main__':
-    game = Game()
-    game.run()
+    main()
@@ -1,11 +1,79 @@
 import pygame
 import random
+import numpy as np
 
-from settings import GAME_WIDTH, GAME_HEIGHT
+from collections import OrderedDict
+
+from settings import (GAME_WIDTH, GAME_HEIGHT, PARTICLE_CAPACITY,
+                      PARTICLE_IMAGE_CACHE_SIZE, PARTICLE_RESPONSE,
+                      PARTICLE_RESTITUTION)
 from states import GameState
+from tracing import tracer
+
+
+class ParticleImageCache:
+    """
+    Least recently used cache of pre-rendered particle images.
+
+    Images are keyed by (size, color, alpha bucket), alpha being quantized
+    into ``alpha_steps`` levels, so particles looking the same share one
+    surface instead of rendering their own. At most ``max_size`` variants
+    are kept alive.
+    """
+    def __init__(self, max_size=PARTICLE_IMAGE_CACHE_SIZE, alpha_steps=16):
+        self.max_size = max_size
+        self.alpha_steps = alpha_steps
+        self.alpha_step = 255 // (alpha_steps - 1)
+        self.images = OrderedDict()
+        self.named_colors = {}
+
+    def __len__(self):
+        return len(self.images)
+
+    def quantize(self, alpha):
+        alpha = min(max(int(alpha), 0), 255)
+        return -(-alpha // self.alpha_step) * self.alpha_step
+
+    def color_key(self, color):
+        if isinstance(color, str):
+            if color not in self.named_colors:
+                self.named_colors[color] = tuple(pygame.Color(color))
+            return self.named_colors[color]
+
+        return tuple(pygame.Color(color))
+
+    def get(self, size, color, alpha=255):
+        key = (size, self.color_key(color), self.quantize(alpha))
+
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+            return image
+
+        image = pygame.Surface((size, size), pygame.SRCALPHA)
+        rgba = pygame.Color(key[1])
+        rgba.a = key[2]
+        pygame.draw.circle(surface=image, color=rgba,
+                           center=(size / 2, size / 2),
+                           radius=size / 2)
+        image = image.convert_alpha()
+
+        self.images[key] = image
+        if len(self.images) > self.max_size:
+            self.images.popitem(last=False)
+
+        return image
+
+    def clear(self):
+        self.images.clear()
+
+
+particle_images = ParticleImageCache()
 
 
 class Particle(pygame.sprite.Sprite):
+    always_update = True
+
     def __init__(self,
                  pos,
                  color,
@@ -32,13 +100,7 @@ class Particle(pygame.sprite.Sprite):
 
         self.alpha = 255
 
-        self.image = pygame.Surface((self.size, self.size)).convert_alpha()
-        self.image.set_colorkey("black")
-
-        pygame.draw.circle(surface=self.image, color=self.color,
-                           center=(self.size/2, self.size/2),
-                           radius=self.size/2)
-
+        self.image = particle_images.get(self.size, self.color, self.alpha)
         self.rect = self.image.get_rect(center=self.pos)
 
     def update(self, dt):
@@ -66,7 +128,7 @@ class Particle(pygame.sprite.Sprite):
 
     def fade(self, dt):
         self.alpha -= self.fade_speed * dt
-        self.image.set_alpha(self.alpha)
+        self.image = particle_images.get(self.size, self.color, self.alpha)
 
         if self.alpha <= 0:
             self.kill()
@@ -111,25 +173,223 @@ class GravityParticle(Particle):
         self.rect.center = self.pos
 
 
+class ParticleSystem:
+    """
+    Batched particle engine storing every particle attribute in NumPy arrays.
+
+    Particles live in a fixed capacity pool: emitting fills free slots and
+    dead particles just free their slot again. A frame update moves, fades
+    and expires every live particle with a few vectorized operations,
+    following the same rules as GravityParticle with fading enabled.
+
+    With a terrain (a tilemap.TileLayer) particles collide with its solid
+    cells, looked up for all particles at once. A particle whose center
+    enters a solid cell goes back on the blocked axes and responds as
+    emitted: 'bounce' reverses its motion on those axes scaled by
+    restitution, 'stick' stops it there and 'die' removes it. Particles
+    moving more than a tile per update may go through thin walls.
+
+    Particle images come from the shared particle_images cache.
+    """
+    responses = ('bounce', 'stick', 'die')
+
+    def __init__(self, capacity=PARTICLE_CAPACITY, terrain=None,
+                 response=PARTICLE_RESPONSE,
+                 restitution=PARTICLE_RESTITUTION):
+        self.capacity = capacity
+        # live particles allowed, up to capacity
+        self.limit = capacity
+        self.terrain = terrain
+        self.default_response = self.responses.index(response)
+        self.restitution = restitution
+
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.previous_pos = np.zeros((capacity, 2), dtype=np.float32)
+        self.direction = np.zeros((capacity, 2), dtype=np.float32)
+        self.speed = np.zeros(capacity, dtype=np.float32)
+        self.gravity = np.zeros(capacity, dtype=np.float32)
+        self.size = np.zeros(capacity, dtype=np.int32)
+        self.color = np.zeros(capacity, dtype=np.int32)
+        self.alpha = np.zeros(capacity, dtype=np.float32)
+        self.fade_speed = np.zeros(capacity, dtype=np.float32)
+        self.birth_time = np.zeros(capacity, dtype=np.float64)
+        self.lifespan = np.zeros(capacity, dtype=np.float32)
+        self.response = np.zeros(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        self.time = 0
+        self.colors = []
+        self.color_ids = {}
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive))
+
+    def color_id(self, color):
+        if color not in self.color_ids:
+            self.color_ids[color] = len(self.colors)
+            self.colors.append(tuple(pygame.Color(color)))
+
+        return self.color_ids[color]
+
+    def emit(self, count, pos, direction, speed, size, color, lifespan,
+             gravity=0, fade_speed=0, response=None):
+        """
+        Spawns up to count particles in free slots of the pool. Particles
+        that do not fit, or would exceed limit, are dropped.
+
+        Every attribute can be a single value shared by all the new
+        particles or a sequence with one value per particle; pos and
+        direction take (x, y) pairs. color may also be a sequence of color
+        ids returned by color_id(). lifespan is in milliseconds, like for
+        Particle. response is how the particles collide with the terrain,
+        the system default when None.
+        """
+        count = min(count, max(0, self.limit - len(self)))
+        slots = np.flatnonzero(~self.alive)[:count]
+        count = len(slots)
+        if not count:
+            return
+
+        if isinstance(color, (str, tuple, pygame.Color)):
+            color = self.color_id(color)
+
+        self.pos[slots] = np.broadcast_to(pos, (count, 2))
+        self.previous_pos[slots] = self.pos[slots]
+        self.direction[slots] = np.broadcast_to(direction, (count, 2))
+        self.speed[slots] = np.broadcast_to(speed, count)
+        self.gravity[slots] = np.broadcast_to(gravity, count)
+        self.size[slots] = np.broadcast_to(size, count)
+        self.color[slots] = np.broadcast_to(color, count)
+        self.lifespan[slots] = np.broadcast_to(lifespan, count)
+        self.fade_speed[slots] = np.broadcast_to(fade_speed, count)
+        self.response[slots] = (self.default_response if response is None
+                                else self.responses.index(response))
+        self.alpha[slots] = 255
+        self.birth_time[slots] = self.time
+        self.alive[slots] = True
+
+    def update(self, dt):
+        self.time += dt * 1000
+
+        alive = self.alive
+        if not alive.any():
+            return
+
+        self.previous_pos[:] = self.pos
+        self.direction[:, 1] += self.gravity * dt
+        self.pos += self.direction * (self.speed * dt)[:, np.newaxis]
+        self.alpha -= self.fade_speed * dt
+
+        expired = ((self.time - self.birth_time > self.lifespan) |
+                   (self.alpha <= 0))
+        alive &= ~expired
+
+        if self.terrain is not None:
+            self.collide(np.flatnonzero(alive))
+
+    def collide(self, live):
+        pos = self.pos.take(live, axis=0)
+        hit = self.terrain.solid_at(pos[:, 0], pos[:, 1])
+        if not hit.any():
+            return
+
+        live = live[hit]
+        pos = pos[hit]
+        previous = self.previous_pos.take(live, axis=0)
+
+        # blocked axes: moving along the axis alone enters a solid cell,
+        # both when only the diagonal move does
+        blocked_x = self.terrain.solid_at(pos[:, 0], previous[:, 1])
+        blocked_y = self.terrain.solid_at(previous[:, 0], pos[:, 1])
+        corner = ~(blocked_x | blocked_y)
+        blocked = np.column_stack((blocked_x | corner, blocked_y | corner))
+
+        self.pos[live] = np.where(blocked, previous, pos)
+
+        # in the order of self.responses
+        bounce, stick, die = (self.response[live] == code for code in range(3))
+        self.direction[live[bounce]] *= np.where(blocked[bounce],
+                                                 -self.restitution, 1)
+        self.speed[live[stick]] = 0
+        self.alive[live[die]] = False
+
+    def clear(self):
+        self.alive[:] = False
+
+    def draw(self, screen, offset=(0, 0), interpolation=1):
+        """
+        Draws the live particles. With an interpolation below 1 they are
+        drawn between their position before and after the last update.
+        """
+        live = np.flatnonzero(self.alive)
+        if not len(live):
+            return
+
+        pos = self.pos[live]
+        if interpolation < 1:
+            previous = self.previous_pos[live]
+            pos = previous + (pos - previous) * interpolation
+
+        size = self.size[live]
+        topleft = (pos - tuple(offset)).astype(np.int32) - (size // 2)[:, np.newaxis]  # noqa: E501
+
+        width, height = screen.get_size()
+        visible = ((topleft[:, 0] > -size) & (topleft[:, 0] < width) &
+                   (topleft[:, 1] > -size) & (topleft[:, 1] < height))
+        live = live[visible]
+        size = size[visible]
+        topleft = topleft[visible]
+
+        steps = particle_images.alpha_steps
+        step = particle_images.alpha_step
+        bucket = (np.clip(self.alpha[live], 0, 255).astype(np.int32) + step - 1) // step  # noqa: E501
+
+        # one cache lookup per distinct (size, color, alpha) combination
+        keys = (size * len(self.colors) + self.color[live]) * steps + bucket
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        images = np.empty(len(unique_keys), dtype=object)
+        for i, key in enumerate(unique_keys.tolist()):
+            key, alpha_bucket = divmod(key, steps)
+            key_size, color_id = divmod(key, len(self.colors))
+            images[i] = particle_images.get(key_size, self.colors[color_id],
+                                            alpha_bucket * step)
+
+        screen.fblits(zip(images[inverse.reshape(-1)].tolist(),
+                          topleft.tolist()))
+
+
 class DustEffect():
-    def __init__(self, particle_class=GravityParticle, sprite_group=None):
+    colors = ["gray", "gray100", "gray60"]
+
+    def __init__(self, particle_class=GravityParticle, sprite_group=None,
+                 particle_system=None):
         self.particle_class = particle_class
         self.sprite_group = sprite_group
+        self.particle_system = particle_system
+        # factor applied to the number of particles emitted
+        self.scale = 1
 
     def randomize_particle_attributes(self):
-        colors = ["gray", "gray100", "gray60"]
-
         attr_dict = {
             'size': random.randint(2, 6),
             'speed': random.randint(25, 50),
-            'color': random.choice(colors),
+            'color': random.choice(self.colors),
             'lifespan': random.randint(500, 1000),
             'fade_speed': 500
         }
 
         return attr_dict
 
+    @tracer.traced('DustEffect.emit', category='particles')
     def emit(self, count, pos, dispersion_width):
+        count = round(count * self.scale)
+        if not count:
+            return
+
+        if self.particle_system is not None:
+            self.emit_batch(count, pos, dispersion_width)
+            return
+
         center = dispersion_width / 2
         leftmost = int(pos[0] - (center / 2))
         rightmost = int(pos[0] + (center / 2))
@@ -163,12 +423,42 @@ class DustEffect():
             )
             self.sprite_group.add(particle)
 
+    def emit_batch(self, count, pos, dispersion_width):
+        """
+        Same effect as emit(), with the random attributes of all the
+        particles drawn at once and spawned in self.particle_system.
+        """
+        system = self.particle_system
+        center = dispersion_width / 2
+        leftmost = int(pos[0] - (center / 2))
+        rightmost = int(pos[0] + (center / 2))
+
+        particle_x = np.random.randint(leftmost, rightmost + 1, count)
+        directions = np.array([(0.10, -1), (0.25, -0.75), (0.35, -0.50)])
+        direction = directions[np.random.randint(0, len(directions), count)]
+        direction[:, 0] *= np.where(particle_x < center, 1, -1)
+
+        color_ids = np.array([system.color_id(color) for color in self.colors])  # noqa: E501
+
+        system.emit(
+            count=count,
+            pos=np.column_stack((particle_x, np.full(count, pos[1]))),
+            direction=direction,
+            speed=np.random.randint(25, 51, count),
+            size=np.random.randint(2, 7, count),
+            color=color_ids[np.random.randint(0, len(color_ids), count)],
+            lifespan=np.random.randint(500, 1001, count),
+            gravity=3,
+            fade_speed=500
+        )
+
 
 class TestParticles(GameState):
     def __init__(self, controller):
         super().__init__(controller)
 
-        self.particle_group = DustEffect()
+        self.particles = ParticleSystem()
+        self.dust_effect = DustEffect(particle_system=self.particles)
 
     def update(self, dt, events):
         count = random.randint(5, 15)
@@ -179,14 +469,14 @@ class TestParticles(GameState):
                 downscaled_y = raw_position[1] / 2
                 position = downscaled_x, downscaled_y
 
-                self.particle_group.emit(
+                self.dust_effect.emit(
                     count=count,
                     pos=position,
                     dispersion_width=24
                 )
 
-        self.particle_group.update(dt)
+        self.particles.update(dt)
 
     def draw(self, screen):
         screen.fill('black')
-        self.particle_group.draw(screen)
+        self.particles.draw(screen)
@@ -1,15 +1,24 @@
 import pygame
-from pytmx.util_pygame import load_pygame
-from os.path import join
 
-from settings import TILE_SIZE, TILED_DIR, DEBUG_FONT
+from functools import partial
+
+from settings import MERGE_COLLISION, PARTICLE_COLLISION
 from states import GameState
-from sprites import Sprite, Tile, AnimatedSprite
+from sprites import Sprite, TrackedSprite
 from player import Player
-from loaders import load_sprite_sheet
-from particles import DustEffect
-from camera import CameraGroup
+from loaders import load_sprite_sheet, release
+from particles import DustEffect, ParticleSystem
+from camera import CameraGroup, StaticLayerRenderer
+from collision import CollisionGrid, Collider, merge_tiles
+from triggers import TriggerSystem
+from streaming import LevelStreamer
+from tilemap import TileLayer
+from animation import AnimationClock
 from debug import debug
+from levels import LevelPrefetcher, TileImages
+from profiler import profiler
+from governor import governor
+from tracing import tracer
 
 
 class PlatformerGame(GameState):
@@ -18,15 +27,24 @@ class PlatformerGame(GameState):
 
         self.player = None
         self.assets = {}
+        self.loaded_assets = []
+        self.tile_images = None
+        self.layers = {}
+        self.streamer = None
         self.sprite_groups = {
             'all': CameraGroup(),
             'items': pygame.sprite.Group(),
             'coins': pygame.sprite.Group(),
             'keys': pygame.sprite.Group(),
-            'terrain': pygame.sprite.Group(),
         }
+        self.collision_grid = CollisionGrid()
+        self.triggers = TriggerSystem()
+        self.animations = AnimationClock()
 
-        self.dust_particles = DustEffect(sprite_group=self.sprite_groups['all'])
+        self.particles = ParticleSystem()
+        self.sprite_groups['all'].particle_system = self.particles
+        self.dust_particles = DustEffect(particle_system=self.particles)
+        governor.subscribe(self.apply_quality)
 
         self.levels = {
             1: 'example_levels/testing-1.tmx',
@@ -34,6 +52,7 @@ class PlatformerGame(GameState):
             3: 'example_levels/testing-3.tmx'
         }
         self.current_level = 1
+        self.prefetcher = LevelPrefetcher()
 
         self.stats = {'coins': 0, 'score': 0}
 
@@ -41,25 +60,61 @@ class PlatformerGame(GameState):
         self.load_assets()
         self.load_map(self.levels[self.current_level], self.sprite_groups)
 
+    def exit(self):
+        for asset in self.loaded_assets:
+            release(asset)
+        self.loaded_assets.clear()
+
     def update(self, dt, events):
         for event in events:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.controller.change_state('ExitScreen')
 
-        self.sprite_groups['all'].update(dt)
-        self.item_collision()
+        if self.streamer is not None:
+            with profiler.phase('streaming'):
+                self.streamer.update(self.player.rect)
+
+        with profiler.phase('update sprites'):
+            self.animations.update(dt)
+            self.sprite_groups['all'].update(dt)
+        with profiler.phase('update particles'):
+            self.particles.update(dt)
+        with profiler.phase('item collision'):
+            self.item_collision()
 
     def draw(self, screen):
         screen.fill("skyblue")
-        self.sprite_groups['all'].custom_draw(screen, self.player)
+        with profiler.phase('custom draw'):
+            self.sprite_groups['all'].custom_draw(screen, self.player,
+                                                  self.controller.interpolation)  # noqa: E501
 
-        debug(self.stats, (10, 10), screen, DEBUG_FONT)
-        debug(self.player.state, (10, 20), screen, DEBUG_FONT)
+        debug(self.stats, (10, 10), screen)
+        debug(self.player.state, (10, 20), screen)
+        if governor.index:
+            debug(governor.status(), (10, 30), screen)
 
+        if profiler.enabled:
+            for name, group in self.sprite_groups.items():
+                profiler.count(name, len(group))
+            profiler.count('particles', len(self.particles))
+            profiler.count('triggers', len(self.triggers))
+            if self.streamer is not None:
+                profiler.count('chunks', len(self.streamer))
+            profiler.count('quality', governor.level.name)
+
+    def apply_quality(self, level):
+        self.dust_particles.scale = level.particle_scale
+        self.particles.limit = level.particle_limit
+
+    @tracer.traced()
     def change_level(self):
         for group in self.sprite_groups.values():
             group.empty()
+        self.collision_grid.clear()
+        self.triggers.clear()
+        self.animations.clear()
+        self.particles.clear()
 
         self.current_level += 1
         if self.current_level > len(self.levels):
@@ -67,6 +122,9 @@ class PlatformerGame(GameState):
 
         self.load_map(self.levels[self.current_level], self.sprite_groups)
 
+    def next_level(self):
+        return self.current_level % len(self.levels) + 1
+
     def load_assets(self):
         player_walking = load_sprite_sheet(
             'tilemap-characters_packed.png',
@@ -74,6 +132,8 @@ class PlatformerGame(GameState):
             [(0, 0), (0, 1)]
         )
 
+        self.loaded_assets.append(player_walking)
+
         player_idle = [player_walking[0]]
         player_jumping = [player_walking[0]]
         player_falling = [player_walking[1]]
@@ -95,100 +155,141 @@ class PlatformerGame(GameState):
             [(5, 11), (5, 12)]
         )
 
-    def load_map(self, filename, sprite_groups):
-        tmx_data = load_pygame(join(TILED_DIR, filename))
+        self.loaded_assets.extend((self.assets['coin'], self.assets['flag']))
 
-        # terrain tiles
-        for x, y, surface in tmx_data.get_layer_by_name('terrain').tiles():
-            Tile(
-                pos=(x * TILE_SIZE, y * TILE_SIZE),
-                surface=surface,
-                groups=(sprite_groups['terrain'], sprite_groups['all'])
-            )
+    @tracer.traced(category='levels', record_args=True)
+    def load_map(self, filename, sprite_groups, merge_collision=MERGE_COLLISION):  # noqa: E501
+        level = self.prefetcher.get(filename)
 
-        # background tiles
-        for x, y, surface in tmx_data.get_layer_by_name('background').tiles():
-            Tile(
-                pos=(x * TILE_SIZE, y * TILE_SIZE),
-                surface=surface,
-                groups=(sprite_groups['all'])
-            )
+        # the old tilesets are released once the new level holds its own
+        previous_tile_images = self.tile_images
+        tile_images = self.tile_images = TileImages(level)
 
-        # foreground tiles
-        for x, y, surface in tmx_data.get_layer_by_name('foreground').tiles():
-            Tile(
-                pos=(x * TILE_SIZE, y * TILE_SIZE),
-                surface=surface,
-                groups=(sprite_groups['all'])
-            )
+        # tile layers, drawn back to front
+        self.layers = {name: TileLayer.from_level(level, name, tile_images)
+                       for name in ('terrain', 'background', 'foreground')}
+        if PARTICLE_COLLISION:
+            self.particles.terrain = self.layers['terrain']
 
-        # animated background
-        for obj in tmx_data.get_layer_by_name('animated_bg'):
-            if obj.name == 'flag':
-                AnimatedSprite(
-                    pos=(obj.x, obj.y),
-                    groups=(sprite_groups['all']),
-                    hitbox_offset=(0, 0),
-                    frames=self.assets['flag'],
-                    animation_speed=2
-                )
+        static_layers = StaticLayerRenderer()
+        sprite_groups['all'].static_layers = static_layers
 
-        # items objects
-        for obj in tmx_data.get_layer_by_name('items'):
+        if level.chunks is not None:
+            # large levels are loaded around the player as it moves
+            self.streamer = LevelStreamer(self, level, static_layers,
+                                          merge_collision)
+        else:
+            self.streamer = None
+            self.load_tiles(level, static_layers, merge_collision)
+
+            for group in ('animated_bg', 'items'):
+                for obj in level.objects(group):
+                    self.spawn_object(group, obj)
+
+        # checkpoint
+        for obj in level.objects('items'):
             if obj.name == 'checkpoint':
-                self.checkpoint_rect = pygame.Rect(obj.x,
-                                                   obj.y,
-                                                   obj.width,
-                                                   obj.height)
-
-            if obj.image:
-                if obj.name == 'coin':
-                    AnimatedSprite(
-                        pos=(obj.x, obj.y),
-                        groups=(sprite_groups['coins'], sprite_groups['all']),
-                        hitbox_offset=(-6, -6),
-                        frames=self.assets['coin'],
-                        animation_speed=5
-                    )
-                elif obj.name == 'key':
-                    Sprite(
-                        pos=(obj.x, obj.y),
-                        surface=obj.image,
-                        groups=(sprite_groups['keys'], sprite_groups['all'])
-                    )
-                else:
-                    Sprite(
-                        pos=(obj.x, obj.y),
-                        surface=obj.image,
-                        groups=(sprite_groups['items'], sprite_groups['all'])
-                    )
+                # reached after the pickups of the same frame
+                self.triggers.add(
+                    pygame.Rect(obj.x, obj.y, obj.width, obj.height),
+                    self.change_level,
+                    priority=1
+                )
 
         # player
-        for obj in tmx_data.get_layer_by_name('player'):
+        for obj in level.objects('player'):
             if obj.name == 'player':
                 self.player = Player(
                               pos=(obj.x, obj.y),
                               groups=sprite_groups['all'],
-                              collision_group=sprite_groups['terrain'],
+                              collision_grid=(self.collision_grid
+                                              if merge_collision
+                                              else self.layers['terrain']),
                               frames=self.assets['player'],
-                              particle_emitter=self.dust_particles
+                              particle_emitter=self.dust_particles,
+                              controls=self.controller.controls
                               )
 
+        if self.streamer is not None:
+            self.streamer.update(self.player.rect, budget=0)
+
+        if previous_tile_images is not None:
+            previous_tile_images.release()
+
+        # get the next level ready while this one is played
+        self.prefetcher.prefetch(self.levels[self.next_level()])
+
+    def load_tiles(self, level, static_layers, merge_collision):
+        for layer in self.layers.values():
+            static_layers.add_layer(layer)
+
+        # terrain collision geometry, single tiles are queried from the
+        # terrain layer itself
+        if merge_collision:
+            if level.collision_rects is None:
+                level.collision_rects = merge_tiles(
+                    self.layers['terrain'].cells())
+
+            for rect in level.collision_rects:
+                self.collision_grid.add(Collider(rect))
+
+    def spawn_object(self, group, obj):
+        """
+        Creates the sprite of an animated_bg or items object and the
+        trigger of pickups. Returns (sprite, trigger), None for what was
+        not created.
+        """
+        sprite_groups = self.sprite_groups
+
+        # animated background
+        if group == 'animated_bg':
+            if obj.name == 'flag':
+                return TrackedSprite(
+                    pos=(obj.x, obj.y),
+                    groups=(sprite_groups['all']),
+                    hitbox_offset=(0, 0),
+                    track=self.animations.track('flag', self.assets['flag'],
+                                                2)
+                ), None
+            return None, None
+
+        # items objects
+        if not obj.gid:
+            return None, None
+
+        if obj.name == 'coin':
+            coin = TrackedSprite(
+                pos=(obj.x, obj.y),
+                groups=(sprite_groups['coins'], sprite_groups['all']),
+                hitbox_offset=(-6, -6),
+                track=self.animations.track('coin', self.assets['coin'], 5)
+            )
+            return coin, self.triggers.add(coin.hitbox_rect,
+                                           partial(self.collect_coin, coin))
+
+        if obj.name == 'key':
+            key = Sprite(
+                pos=(obj.x, obj.y),
+                surface=self.tile_images[obj.gid],
+                groups=(sprite_groups['keys'], sprite_groups['all'])
+            )
+            return key, self.triggers.add(key.rect,
+                                          partial(self.collect_key, key))
+
+        return Sprite(
+            pos=(obj.x, obj.y),
+            surface=self.tile_images[obj.gid],
+            groups=(sprite_groups['items'], sprite_groups['all'])
+        ), None
+
     def item_collision(self):
-        # collision with keys
-        for key in self.sprite_groups['keys']:
-            if key.rect.colliderect(self.player.hitbox_rect):
-                self.stats['score'] += 100
-                key.kill()
-
-        # collision with coins
-        for coin in self.sprite_groups['coins']:
-            if coin.hitbox_rect.colliderect(self.player.hitbox_rect):
-                self.stats['coins'] += 1
-                self.stats['score'] += 10
-                coin.kill()
-
-        # collision with checkpoint
-        if pygame.Rect.colliderect(self.checkpoint_rect,
-                                   self.player.hitbox_rect):
-            self.change_level()
+        self.triggers.check(self.player.hitbox_rect)
+
+    def collect_key(self, key):
+        self.stats['score'] += 100
+        key.kill()
+
+    def collect_coin(self, coin):
+        self.stats['coins'] += 1
+        self.stats['score'] += 10
+        coin.kill()
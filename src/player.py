@@ -2,15 +2,24 @@ import pygame
 
 from pygame.math import Vector2 as vector
 
+from loaders import flip_frames
+
 
 class Player(pygame.sprite.Sprite):
-    def __init__(self, pos, groups, collision_group, frames, particle_emitter):
-        super().__init__(groups)
+    always_update = True
+    # drawn over the level sprites, even those streamed in after it
+    draw_layer = 1
+
+    def __init__(self, pos, groups, collision_grid, frames, particle_emitter,
+                 controls):
+        super().__init__()
 
         self.state = 'idle'
         self.last_state = self.state
 
         self.frames = frames
+        self.flipped_frames = {state: flip_frames(state_frames)
+                               for state, state_frames in frames.items()}
         self.frame_index = 0
         self.image = self.frames[self.state][self.frame_index]
 
@@ -29,10 +38,14 @@ class Player(pygame.sprite.Sprite):
         self.jump_key = False
         self.jump_height = 400
 
-        self.collision_group = collision_group
+        self.collision_grid = collision_grid
         self.on_surface = False
 
         self.dust_effect = particle_emitter
+        self.controls = controls
+
+        # joined last, groups may index the sprite by its rect
+        self.add(groups)
 
     def update(self, dt):
         self.old_rect = self.hitbox_rect.copy()
@@ -42,7 +55,7 @@ class Player(pygame.sprite.Sprite):
         self.animate(dt)
 
     def input(self):
-        keys = pygame.key.get_pressed()
+        keys = self.controls.pressed()
         input_vector = vector(0, 0)
 
         if keys[pygame.K_RIGHT]:
@@ -105,12 +118,18 @@ class Player(pygame.sprite.Sprite):
     def check_on_surface(self):
         floor_rect = pygame.Rect(self.hitbox_rect.bottomleft,
                                  (self.hitbox_rect.width, 2))
-        collide_rects = [sprite.rect for sprite in self.collision_group]
+        collide_rects = [sprite.rect for sprite in
+                         self.collision_grid.query(floor_rect)]
         self.last_state = self.state
         self.on_surface = True if floor_rect.collidelist(collide_rects) >= 0 else False  # noqa: E501
 
     def collision(self, axis):
-        for sprite in self.collision_group:
+        # resolving only pushes the hitbox back towards its old position, so
+        # the cells under both rects hold every tile it can touch
+        candidates = self.collision_grid.query(
+            self.hitbox_rect.union(self.old_rect))
+
+        for sprite in candidates:
             if sprite.rect.colliderect(self.hitbox_rect):
                 if axis == 'horizontal':
                     # left
@@ -135,6 +154,6 @@ class Player(pygame.sprite.Sprite):
 
     def animate(self, dt):
         self.frame_index += self.animation_speed * dt
-        self.image = self.frames[self.state][int(self.frame_index %
-                                                 len(self.frames[self.state]))]
-        self.image = self.image if self.facing_left else pygame.transform.flip(self.image, True, False)  # noqa: E501
+        frames = self.frames if self.facing_left else self.flipped_frames
+        self.image = frames[self.state][int(self.frame_index %
+                                            len(frames[self.state]))]
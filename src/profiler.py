@@ -0,0 +1,137 @@
+import pygame
+
+from collections import deque
+from contextlib import nullcontext
+from time import perf_counter
+
+from settings import WHITE, BLACK, PROFILER_HISTORY
+from debug import debug
+
+
+NO_PHASE = nullcontext()
+
+
+class Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        current = self.profiler.current
+        current[self.name] = current.get(self.name, 0) + perf_counter() - self.start  # noqa: E501
+
+
+class FrameProfiler:
+    """
+    Times the phases of every frame while enabled.
+
+    Code to time is wrapped in ``with profiler.phase(name):`` blocks; a
+    phase run several times in a frame (like simulation steps) adds up.
+    The last ``history`` frames are kept in ring buffers and summarized as
+    rolling mean, 95th percentile and maximum by draw(). While disabled,
+    phase() returns a shared no-op context so instrumented code pays
+    almost nothing.
+    """
+    def __init__(self, history=PROFILER_HISTORY):
+        self.enabled = False
+        self.history = history
+        self.phases = {}
+        self.frames = deque(maxlen=history)
+        self.counts = {}
+        self.current = {}
+        self.frame_start = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.reset()
+
+    def reset(self):
+        self.phases.clear()
+        self.frames.clear()
+        self.counts.clear()
+        self.current.clear()
+        self.frame_start = None
+
+    def phase(self, name):
+        if not self.enabled:
+            return NO_PHASE
+        return Phase(self, name)
+
+    def count(self, name, value):
+        self.counts[name] = value
+
+    def end_frame(self):
+        """
+        Closes the frame started by the previous call and starts the next.
+        """
+        if not self.enabled:
+            return
+
+        now = perf_counter()
+        if self.frame_start is not None:
+            self.frames.append(now - self.frame_start)
+
+            for name in self.current:
+                if name not in self.phases:
+                    self.phases[name] = deque(maxlen=self.history)
+            for name, times in self.phases.items():
+                times.append(self.current.get(name, 0))
+
+        self.current = {}
+        self.frame_start = now
+
+    def summary(self, times):
+        if not times:
+            return 0, 0, 0
+
+        ordered = sorted(times)
+        return (sum(times) / len(times) * 1000,
+                ordered[int(len(ordered) * 0.95)] * 1000,
+                ordered[-1] * 1000)
+
+    def draw(self, screen, font=None, pos=(250, 10)):
+        if not self.enabled:
+            return
+
+        x, y = pos
+        rows = [('frame', self.frames)] + list(self.phases.items())
+        debug('ms', (x, y), screen, font)
+        debug(' mean   p95   max', (x + 70, y), screen, font)
+
+        for name, times in rows:
+            y += 10
+            mean, p95, maximum = self.summary(times)
+            debug(name, (x, y), screen, font)
+            debug(f'{mean:5.1f} {p95:5.1f} {maximum:5.1f}', (x + 70, y),
+                  screen, font)
+
+        for name, value in self.counts.items():
+            y += 10
+            debug(f'{name}: {value}', (x, y), screen, font)
+
+        self.draw_graph(screen, pygame.Rect(x, y + 14, self.history, 40))
+
+    def draw_graph(self, screen, rect, scale_ms=50):
+        """
+        Draws the frame times as bars, scaled so rect.height is scale_ms,
+        with lines at 60 and 30 frames per second.
+        """
+        pygame.draw.rect(screen, BLACK, rect)
+
+        for i, frame_time in enumerate(self.frames):
+            height = min(rect.height, int(frame_time * 1000 / scale_ms * rect.height))  # noqa: E501
+            color = 'green' if frame_time < 1 / 59 else 'yellow' if frame_time < 1 / 29 else 'red'  # noqa: E501
+            pygame.draw.line(screen, color,
+                             (rect.left + i, rect.bottom - 1),
+                             (rect.left + i, rect.bottom - height))
+
+        for fps in (60, 30):
+            y = rect.bottom - int(1000 / fps / scale_ms * rect.height)
+            pygame.draw.line(screen, WHITE, (rect.left, y), (rect.right, y))
+
+
+profiler = FrameProfiler()
@@ -1,5 +1,4 @@
 import os
-import pygame
 
 
 TILE_SIZE = 18
@@ -7,16 +6,95 @@ TILES_X = 26
 TILES_Y = 15
 GAME_WIDTH = TILES_X * TILE_SIZE    # 468
 GAME_HEIGHT = TILES_Y * TILE_SIZE   # 270
-SCREEN_WIDTH = GAME_WIDTH * 2
-SCREEN_HEIGHT = GAME_HEIGHT * 2
+
+# the canvas is presented at SCALE times its size, with SCALED_DISPLAY the
+# display scales it instead and picks the largest factor fitting the desktop
+SCALE = 2
+SCALED_DISPLAY = False
+SCREEN_WIDTH = GAME_WIDTH * SCALE
+SCREEN_HEIGHT = GAME_HEIGHT * SCALE
+
+# with FIXED_TIMESTEP the game simulates SIMULATION_RATE fixed steps per
+# second, catching up at most MAX_SIMULATION_STEPS per frame, while frames
+# are rendered at up to FPS with sprites interpolated between steps
+FIXED_TIMESTEP = True
+SIMULATION_RATE = 30
+MAX_SIMULATION_STEPS = 5
+FPS = 60
+
+# static tile layers are pre-rendered in chunks of CHUNK_TILES x CHUNK_TILES
+CHUNK_TILES = 16
+
+# levels that are infinite or have at least STREAM_MIN_TILES cells are
+# streamed in by chunks of CHUNK_TILES around the player: chunks within
+# STREAM_LOAD_DISTANCE chunks of the area around the player are loaded at
+# once, up to STREAM_PRELOAD_DISTANCE they are loaded STREAM_CHUNKS_PER_FRAME
+# per frame and chunks beyond STREAM_UNLOAD_DISTANCE are unloaded
+STREAM_MIN_TILES = 50000
+STREAM_LOAD_DISTANCE = 0
+STREAM_PRELOAD_DISTANCE = 1
+STREAM_UNLOAD_DISTANCE = 3
+STREAM_CHUNKS_PER_FRAME = 1
+
+# CameraGroup only updates sprites within CULL_MARGIN pixels of the view
+CULL_MARGIN = TILE_SIZE * 4
+CULL_UPDATES = True
+
+# unreferenced assets are evicted once cached surfaces use more memory
+ASSET_MEMORY_LIMIT = 64 * 1024 * 1024
+
+# maximum number of live particles in a particles.ParticleSystem
+PARTICLE_CAPACITY = 20000
+# maximum number of (size, color, alpha) particle images kept in memory
+PARTICLE_IMAGE_CACHE_SIZE = 512
+# with PARTICLE_COLLISION particles hitting terrain tiles 'bounce' off
+# them, keeping PARTICLE_RESTITUTION of their speed, 'stick' or 'die'
+PARTICLE_COLLISION = True
+PARTICLE_RESPONSE = 'bounce'
+PARTICLE_RESTITUTION = 0.4
+
+# the quality governor lowers the quality level (see governor.py) when the
+# median work time of the last QUALITY_WINDOW frames is over the
+# QUALITY_FRAME_BUDGET seconds, and raises it back when it is under
+# QUALITY_RECOVERY of the budget
+QUALITY_GOVERNOR = True
+QUALITY_FRAME_BUDGET = 1 / FPS
+QUALITY_WINDOW = 30
+QUALITY_RECOVERY = 0.5
+
+# number of frames summarized by the profiler overlay (toggled with F3)
+PROFILER_HISTORY = 120
+
+# set GAME_TRACE to a file name to record a Chrome trace of the session,
+# written when the game exits; at most TRACE_CAPACITY events are kept
+TRACE_FILE = os.environ.get('GAME_TRACE')
+TRACE_CAPACITY = 100000
 
 ROOT_DIR = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 GRAPHICS_DIR = os.path.join(ROOT_DIR, 'data/graphics')
 TILED_DIR = os.path.join(ROOT_DIR, 'data/tiled')
 FONTS_DIR = os.path.join(ROOT_DIR, 'data/fonts')
+LEVEL_CACHE_DIR = os.path.join(ROOT_DIR, 'data/cache/levels')
+
+# bake.py slices the sheets listed in ASSET_MANIFEST and packs every image
+# of GRAPHICS_DIR into ATLAS_SIZE pages of raw pixels in BAKED_ASSETS_DIR;
+# with USE_BAKED_ASSETS the loaders map the pages instead of decoding PNGs
+ASSET_MANIFEST = os.path.join(GRAPHICS_DIR, 'manifest.json')
+BAKED_ASSETS_DIR = os.path.join(ROOT_DIR, 'data/cache/assets')
+ATLAS_SIZE = 1024
+USE_BAKED_ASSETS = True
+
+# merge solid terrain tiles into larger collision rects when loading a map
+MERGE_COLLISION = True
 
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 
-pygame.font.init()
-DEBUG_FONT = pygame.font.Font(os.path.join(FONTS_DIR, 'grand9k-pixel.ttf'), 8)
+# font of the debug texts and the profiler overlay, loaded on first use
+DEBUG_FONT_FILE = os.path.join(FONTS_DIR, 'grand9k-pixel.ttf')
+DEBUG_FONT_SIZE = 8
+# debug texts are drawn from a pre-rendered glyph atlas of the debug font
+# with DEBUG_BITMAP_FONT, else rendered and kept in a cache of at most
+# TEXT_CACHE_SIZE surfaces
+DEBUG_BITMAP_FONT = True
+TEXT_CACHE_SIZE = 256
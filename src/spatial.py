@@ -0,0 +1,79 @@
+from settings import TILE_SIZE
+
+
+class SpatialHash:
+    """
+    Uniform grid of buckets for objects that can move.
+
+    Each object is stored in every cell its rect overlaps. Moving an object
+    only touches the buckets when it crosses a cell border, and region
+    queries look at the cells overlapping the region instead of every
+    object.
+    """
+    def __init__(self, cell_size=TILE_SIZE * 4):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.objects = {}
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __contains__(self, obj):
+        return obj in self.objects
+
+    def cell_range(self, rect):
+        size = self.cell_size
+        return (int(rect.left // size),
+                int(rect.top // size),
+                int(rect.right // size),
+                int(rect.bottom // size))
+
+    def insert(self, obj, rect):
+        cell_range = self.cell_range(rect)
+        self.objects[obj] = cell_range
+
+        left, top, right, bottom = cell_range
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                self.cells.setdefault((x, y), set()).add(obj)
+
+    def remove(self, obj):
+        cell_range = self.objects.pop(obj, None)
+        if cell_range is None:
+            return
+
+        left, top, right, bottom = cell_range
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                bucket = self.cells[(x, y)]
+                bucket.discard(obj)
+                if not bucket:
+                    del self.cells[(x, y)]
+
+    def move(self, obj, rect):
+        if self.objects.get(obj) == self.cell_range(rect):
+            return
+
+        self.remove(obj)
+        self.insert(obj, rect)
+
+    def query(self, rect):
+        """
+        Returns the set of objects stored in the cells overlapped by rect.
+        Results are candidates only, they are not tested against rect.
+        """
+        left, top, right, bottom = self.cell_range(rect)
+        cells = self.cells
+        found = set()
+
+        for y in range(top, bottom + 1):
+            for x in range(left, right + 1):
+                bucket = cells.get((x, y))
+                if bucket:
+                    found.update(bucket)
+
+        return found
+
+    def clear(self):
+        self.cells.clear()
+        self.objects.clear()
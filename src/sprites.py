@@ -1,9 +1,11 @@
 import pygame
 
+from loaders import flip_frames
+
 
 class Sprite(pygame.sprite.Sprite):
     def __init__(self, pos, surface, groups, hitbox_offset=None):
-        super().__init__(groups)
+        super().__init__()
 
         self.image = surface
         self.rect = self.image.get_rect(topleft=pos)
@@ -14,6 +16,9 @@ class Sprite(pygame.sprite.Sprite):
                                                  hitbox_offset[1])
             self.old_rect = self.hitbox_rect.copy()
 
+        # joined last, groups may index the sprite by its rect
+        self.add(groups)
+
 
 class AnimatedSprite(Sprite):
     def __init__(self,
@@ -21,8 +26,9 @@ class AnimatedSprite(Sprite):
                  groups,
                  frames,
                  animation_speed,
-                 hitbox_offset=None):
-        self.frames = frames
+                 hitbox_offset=None,
+                 flip=None):
+        self.frames = flip_frames(frames, *flip) if flip else frames
         self.frame_index = 0
         self.hitbox_offset = hitbox_offset if hitbox_offset else None
 
@@ -41,6 +47,29 @@ class AnimatedSprite(Sprite):
         self.animate(dt)
 
 
-class Tile(Sprite):
-    def __init__(self, pos, surface, groups):
-        super().__init__(pos, surface, groups)
+class TrackedSprite(pygame.sprite.Sprite):
+    """
+    Sprite showing the current frame of a shared animation.AnimationTrack,
+    phase frames ahead of it. It has nothing to update on its own.
+    """
+    updates = False
+
+    def __init__(self, pos, groups, track, phase=0, hitbox_offset=None):
+        super().__init__()
+
+        self.track = track
+        self.phase = phase
+        self.rect = self.image.get_rect(topleft=pos)
+        self.old_rect = self.rect.copy()
+
+        if hitbox_offset:
+            self.hitbox_rect = self.rect.inflate(hitbox_offset[0],
+                                                 hitbox_offset[1])
+            self.old_rect = self.hitbox_rect.copy()
+
+        # joined last, groups may index the sprite by its rect
+        self.add(groups)
+
+    @property
+    def image(self):
+        return self.track.frame(self.phase)
@@ -1,36 +1,83 @@
 import pygame
 
 from settings import WHITE, BLACK, GAME_WIDTH, GAME_HEIGHT
+from controls import KeyboardInput
+from tracing import tracer
 
 
 class Controller:
-    def __init__(self):
+    def __init__(self, controls=None):
         self.states = {}
+        self.factories = {}
         self.current_state = None
         self.exit = False
 
+        # input source of the game, live keyboard unless replaying
+        self.controls = controls if controls else KeyboardInput()
+
+        # fraction of a simulation step elapsed since the last update, for
+        # states interpolating what they draw
+        self.interpolation = 1
+
     def add_state(self, name, state):
         self.states[name] = state
 
+    def add_state_factory(self, name, factory):
+        """
+        Registers a state built by factory(controller=self) the first time
+        it is entered or asked for, like a GameState class.
+        """
+        self.factories[name] = factory
+
+    def state(self, name):
+        state = self.states.get(name)
+        if state is None:
+            with tracer.span('Controller.create_state', state=name):
+                state = self.states[name] = self.factories[name](
+                    controller=self)
+        return state
+
     def change_state(self, name):
-        if self.current_state:
-            self.current_state.exit()
+        with tracer.span('Controller.change_state', state=name):
+            if self.current_state:
+                self.current_state.exit()
 
-        self.current_state = self.states[name]
-        self.current_state.enter()
+            self.current_state = self.state(name)
+            self.current_state.dirty = True
+            self.current_state.enter()
 
     def update(self, dt, events):
+        events = self.controls.step(dt, events)
+
         if self.current_state:
             self.current_state.update(dt, events)
 
-    def draw(self, screen):
+    def draw(self, screen, changed=True):
+        """
+        Draws the current state and returns whether the screen changed.
+        States that are not animated are only drawn again after entering
+        them or after invalidate(), animated states also when changed.
+        """
+        state = self.current_state
+        if not state or not (state.dirty or (state.animated and changed)):
+            return False
+
+        state.draw(screen)
+        state.dirty = False
+        return True
+
+    def invalidate(self):
         if self.current_state:
-            self.current_state.draw(screen)
+            self.current_state.dirty = True
 
 
 class GameState:
+    # animated states are drawn every frame, the others only when dirty
+    animated = True
+
     def __init__(self, controller):
         self.controller = controller
+        self.dirty = True
 
     def enter(self):
         pass
@@ -46,6 +93,8 @@ class GameState:
 
 
 class SplashScreen(GameState):
+    animated = False
+
     def __init__(self, controller):
         super().__init__(controller)
         self.font = pygame.font.Font(None, 74)
@@ -64,6 +113,8 @@ class SplashScreen(GameState):
 
 
 class ExitScreen(GameState):
+    animated = False
+
     def __init__(self, controller):
         super().__init__(controller)
         self.font = pygame.font.Font(None, 74)
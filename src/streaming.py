@@ -0,0 +1,133 @@
+import pygame
+
+from settings import (GAME_WIDTH, GAME_HEIGHT, STREAM_LOAD_DISTANCE,
+                      STREAM_PRELOAD_DISTANCE, STREAM_UNLOAD_DISTANCE,
+                      STREAM_CHUNKS_PER_FRAME, CHUNK_TILES, MERGE_COLLISION)
+from collision import Collider, merge_tiles
+
+
+class LoadedChunk:
+    def __init__(self):
+        self.colliders = []
+        self.objects = []
+
+
+class LevelStreamer:
+    """
+    Keeps the chunks of a streamed level (see levels.index_chunks) loaded
+    around the player.
+
+    Loading a chunk renders its static layer chunk surface from the game
+    tile layers and creates its collision rects and objects; unloading
+    drops all of them again.
+    update() loads the chunks around the player at once, preloads the next
+    ring of chunks a few per frame and unloads chunks far behind. Pickups
+    collected before their chunk was unloaded are not spawned again.
+    """
+    def __init__(self, game, level, static_layers,
+                 merge_collision=MERGE_COLLISION, chunk_tiles=CHUNK_TILES):
+        self.game = game
+        self.level = level
+        self.static_layers = static_layers
+        self.merge_collision = merge_collision
+        self.chunk_width = chunk_tiles * level.tile_width
+        self.chunk_height = chunk_tiles * level.tile_height
+
+        self.loaded = {}
+        self.collected = set()
+
+    def __len__(self):
+        return len(self.loaded)
+
+    def chunks_around(self, rect, distance):
+        """
+        Returns the keys of the level chunks overlapped by rect grown by
+        distance chunks on every side.
+        """
+        left = int(rect.left // self.chunk_width) - distance
+        top = int(rect.top // self.chunk_height) - distance
+        right = int(rect.right // self.chunk_width) + distance
+        bottom = int(rect.bottom // self.chunk_height) + distance
+
+        chunks = self.level.chunks
+        return {(x, y)
+                for y in range(top, bottom + 1)
+                for x in range(left, right + 1)
+                if (x, y) in chunks}
+
+    def distance(self, key, pos):
+        x = (key[0] + 0.5) * self.chunk_width - pos[0]
+        y = (key[1] + 0.5) * self.chunk_height - pos[1]
+        return x * x + y * y
+
+    def area(self, target_rect):
+        # twice the view, the view always contains the player
+        area = pygame.Rect(0, 0, GAME_WIDTH * 2, GAME_HEIGHT * 2)
+        area.center = target_rect.center
+        return area
+
+    def update(self, target_rect, budget=STREAM_CHUNKS_PER_FRAME):
+        area = self.area(target_rect)
+
+        for key in self.chunks_around(area, STREAM_LOAD_DISTANCE):
+            if key not in self.loaded:
+                self.load_chunk(key)
+
+        preload = [key for key in self.chunks_around(area,
+                                                     STREAM_PRELOAD_DISTANCE)
+                   if key not in self.loaded]
+        preload.sort(key=lambda key: self.distance(key, area.center))
+        for key in preload[:budget]:
+            self.load_chunk(key)
+
+        keep = self.chunks_around(area, STREAM_UNLOAD_DISTANCE)
+        for key in [key for key in self.loaded if key not in keep]:
+            self.unload_chunk(key)
+
+    def load_chunk(self, key):
+        chunk = self.level.chunks[key]
+        game = self.game
+        loaded = self.loaded[key] = LoadedChunk()
+        rect = pygame.Rect(key[0] * self.chunk_width,
+                           key[1] * self.chunk_height,
+                           self.chunk_width, self.chunk_height)
+
+        for layer in game.layers.values():
+            self.static_layers.add_layer(layer, rect)
+
+        # without merging, actors query the terrain layer directly
+        if self.merge_collision:
+            if chunk.collision_rects is None:
+                chunk.collision_rects = merge_tiles(
+                    game.layers['terrain'].cells(rect))
+
+            loaded.colliders.extend(Collider(rect)
+                                    for rect in chunk.collision_rects)
+
+        for collider in loaded.colliders:
+            game.collision_grid.add(collider)
+
+        for group, index, obj in chunk.objects:
+            if (group, index) not in self.collected:
+                sprite, trigger = game.spawn_object(group, obj)
+                loaded.objects.append((group, index, sprite, trigger))
+
+    def unload_chunk(self, key):
+        loaded = self.loaded.pop(key)
+        game = self.game
+
+        for collider in loaded.colliders:
+            game.collision_grid.remove(collider)
+
+        self.static_layers.remove_chunk(key)
+
+        for group, index, sprite, trigger in loaded.objects:
+            if sprite is not None:
+                # killed sprites were picked up
+                if sprite.alive():
+                    sprite.kill()
+                else:
+                    self.collected.add((group, index))
+
+            if trigger is not None:
+                game.triggers.remove(trigger)
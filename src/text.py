@@ -0,0 +1,117 @@
+import string
+import pygame
+
+from collections import OrderedDict
+
+from settings import TEXT_CACHE_SIZE
+
+
+class TextRenderer:
+    """
+    Least recently used cache of rendered texts.
+
+    Surfaces are keyed by (font, text, color), so texts that do not change
+    between frames are rendered once instead of every frame. At most
+    ``max_size`` surfaces are kept alive.
+    """
+    def __init__(self, max_size=TEXT_CACHE_SIZE):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    def render(self, font, text, color, antialias=True):
+        key = (font, text, tuple(color), antialias)
+
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        surface = self.surfaces[key] = font.render(text, antialias, color)
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+text_renderer = TextRenderer()
+
+
+class BitmapFont:
+    """
+    Glyphs of a font pre-rendered into a single atlas surface.
+
+    Strings are drawn by blitting the glyph of each character side by side,
+    so text changing every frame, like counters, costs a few small blits
+    instead of rendering it. Glyphs are placed by their advance without
+    kerning, which matches the font for monospaced and pixel fonts.
+    Characters missing from ``characters`` are rendered on first use.
+
+    With a background color the glyphs are opaque and fill the text rect,
+    copying them is cheaper than blending transparent glyphs.
+    """
+    def __init__(self, font, color, background=None, antialias=True,
+                 characters=string.printable.strip() + ' '):
+        self.font = font
+        self.color = color
+        self.background = background
+        self.antialias = antialias
+        self.glyphs = {}
+        self.widths = {}
+
+        glyphs = [self.render(character) for character in characters]
+        # rendered glyphs can be taller than font.get_height()
+        self.height = max(glyph.get_height() for glyph in glyphs)
+
+        size = (sum(glyph.get_width() for glyph in glyphs), self.height)
+        if background is None:
+            self.atlas = pygame.Surface(size, pygame.SRCALPHA).convert_alpha()
+        else:
+            self.atlas = pygame.Surface(size).convert()
+            self.atlas.fill(background)
+
+        x = 0
+        for character, glyph in zip(characters, glyphs):
+            self.atlas.blit(glyph, (x, 0))
+            self.glyphs[character] = self.atlas.subsurface(
+                (x, 0, glyph.get_width(), glyph.get_height()))
+            self.widths[character] = glyph.get_width()
+            x += glyph.get_width()
+
+    def render(self, character):
+        return self.font.render(character, self.antialias, self.color,
+                                self.background)
+
+    def glyph(self, character):
+        glyph = self.glyphs.get(character)
+        if glyph is None:
+            glyph = self.glyphs[character] = self.render(character)
+            self.widths[character] = glyph.get_width()
+        return glyph
+
+    def size(self, text):
+        widths = self.widths
+        return (sum(widths[character] if character in widths
+                    else self.glyph(character).get_width()
+                    for character in text),
+                self.height)
+
+    def draw(self, surface, text, pos):
+        """
+        Draws text with its top left corner at pos and returns the rect
+        covered by it.
+        """
+        x, y = pos
+        blits = []
+        for character in text:
+            glyph = self.glyph(character)
+            blits.append((glyph, (x, y)))
+            x += self.widths[character]
+
+        surface.fblits(blits)
+        return pygame.Rect(pos, (x - pos[0], self.height))
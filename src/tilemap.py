@@ -0,0 +1,114 @@
+import math
+import pygame
+import numpy as np
+
+from collision import Collider
+
+
+class TileLayer:
+    """
+    Tile layer stored as a grid of raw gids, without an object per tile.
+
+    The grid is a NumPy view over the level's gid array, plus a boolean
+    grid of the non empty cells, so a layer costs 5 bytes per cell whatever
+    its content. Tile surfaces come from the level's shared gid to surface
+    table (levels.TileImages).
+
+    A terrain layer can serve as the collision source of actors: query()
+    returns a Collider for every solid cell overlapped by a rect, like
+    collision.CollisionGrid does for single tiles, and solid_at() looks up
+    many points at once, like particles.
+    """
+    def __init__(self, grid, tile_images, tile_width, tile_height):
+        self.grid = grid
+        self.height, self.width = grid.shape
+        self.tile_images = tile_images
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.colliders = {}
+        self.solid = grid != 0
+
+    @classmethod
+    def from_level(cls, level, name, tile_images):
+        return cls(level.grid(name), tile_images, level.tile_width,
+                   level.tile_height)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.grid))
+
+    def cell_range(self, rect):
+        """
+        Returns the (left, top, right, bottom) cells overlapped by a pixel
+        rect, right and bottom excluded, clipped to the layer. Edges lying
+        on a cell border do not overlap the next cell.
+        """
+        return (max(0, int(rect.left // self.tile_width)),
+                max(0, int(rect.top // self.tile_height)),
+                min(self.width, math.ceil(rect.right / self.tile_width)),
+                min(self.height, math.ceil(rect.bottom / self.tile_height)))
+
+    def gid_at(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return int(self.grid[y, x])
+        return 0
+
+    def image(self, gid):
+        return self.tile_images[gid]
+
+    def tiles(self, rect=None):
+        """
+        Returns (x, y, gid) for the non empty cells overlapped by a pixel
+        rect, or of the whole layer, in row-major order.
+        """
+        if rect is None:
+            left, top, right, bottom = 0, 0, self.width, self.height
+        else:
+            left, top, right, bottom = self.cell_range(rect)
+            if left >= right or top >= bottom:
+                return []
+
+        area = self.grid[top:bottom, left:right]
+        rows, columns = np.nonzero(area)
+
+        return list(zip((columns + left).tolist(),
+                        (rows + top).tolist(),
+                        area[rows, columns].tolist()))
+
+    def solid_at(self, x, y):
+        """
+        Vectorized lookup of pixel positions: returns whether each (x, y)
+        of the arrays x and y lies on a non empty cell. Positions outside
+        the layer are not solid.
+        """
+        # truncating is flooring for the positions inside the layer
+        column = (x * (1 / self.tile_width)).astype(np.intp)
+        row = (y * (1 / self.tile_height)).astype(np.intp)
+        inside = ((x >= 0) & (column < self.width) &
+                  (y >= 0) & (row < self.height))
+
+        np.clip(column, 0, self.width - 1, out=column)
+        np.clip(row, 0, self.height - 1, out=row)
+        return self.solid[row, column] & inside
+
+    def cells(self, rect=None):
+        return [(x, y) for x, y, _ in self.tiles(rect)]
+
+    def query(self, rect):
+        """
+        Returns a Collider for each non empty cell overlapped by rect, in
+        row-major order. Colliders are created once per cell and reused.
+        """
+        colliders = self.colliders
+        found = []
+
+        for x, y, _ in self.tiles(rect):
+            collider = colliders.get((x, y))
+            if collider is None:
+                collider = colliders[(x, y)] = Collider(self.cell_rect(x, y))
+            found.append(collider)
+
+        return found
+
+    def cell_rect(self, x, y):
+        return pygame.Rect(x * self.tile_width, y * self.tile_height,
+                           self.tile_width, self.tile_height)
@@ -0,0 +1,116 @@
+import os
+import json
+import atexit
+import threading
+
+from collections import deque
+from contextlib import nullcontext
+from functools import wraps
+from time import perf_counter
+
+from settings import TRACE_FILE, TRACE_CAPACITY
+
+
+NO_SPAN = nullcontext()
+
+
+class Span:
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.category, self.start,
+                           perf_counter() - self.start, self.args)
+
+
+class Tracer:
+    """
+    Records spans of work as Chrome trace events.
+
+    Spans are opened with ``with tracer.span(name):`` or by decorating a
+    function with ``@tracer.traced()``. The last ``capacity`` events are
+    kept in memory and written by export() in the Chrome trace event
+    format, which chrome://tracing and https://ui.perfetto.dev open.
+
+    A disabled tracer returns a shared no-op context from span() and leaves
+    decorated functions untouched, so instrumentation costs nothing.
+    """
+    def __init__(self, path=None, capacity=TRACE_CAPACITY):
+        self.path = path
+        self.enabled = bool(path)
+        self.events = deque(maxlen=capacity)
+        self.threads = {}
+        self.origin = perf_counter()
+
+    def span(self, name, category='game', **args):
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name, category, args)
+
+    def traced(self, name=None, category='game', record_args=False):
+        """
+        Decorator tracing every call of a function as a span named after
+        it. With record_args the plain (str, int, float) positional
+        arguments, like file names, are saved with the span.
+        """
+        def decorator(function):
+            if not self.enabled:
+                return function
+
+            span_name = name or function.__qualname__
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                span_args = {}
+                if record_args:
+                    span_args['args'] = [arg for arg in args
+                                         if isinstance(arg, (str, int, float))]  # noqa: E501
+                with Span(self, span_name, category, span_args):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def record(self, name, category, start, duration, args):
+        thread = threading.current_thread()
+        self.threads.setdefault(thread.ident, thread.name)
+
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (start - self.origin) * 1e6,
+            'dur': duration * 1e6,
+            'pid': os.getpid(),
+            'tid': thread.ident,
+        }
+        if args:
+            event['args'] = args
+
+        self.events.append(event)
+
+    def export(self, path=None):
+        path = path or self.path
+        pid = os.getpid()
+
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                     'tid': ident, 'args': {'name': name}}
+                    for ident, name in self.threads.items()]
+
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': metadata + list(self.events),
+                       'displayTimeUnit': 'ms'}, file)
+
+
+tracer = Tracer(TRACE_FILE)
+
+if tracer.enabled:
+    atexit.register(tracer.export)
@@ -0,0 +1,67 @@
+from itertools import count
+
+from settings import TILE_SIZE
+from spatial import SpatialHash
+
+
+class Trigger:
+    def __init__(self, rect, callback, priority, once, order):
+        self.rect = rect
+        self.callback = callback
+        self.priority = priority
+        self.once = once
+        self.order = order
+
+
+class TriggerSystem:
+    """
+    Areas firing a callback when an actor overlaps them, like pickups and
+    checkpoints.
+
+    Triggers are kept in a spatial hash, so check() only tests the few
+    triggers around the actor. Overlapped triggers fire by priority, then
+    in the order they were added; a ``once`` trigger is removed when it
+    fires. Callbacks may add, remove or clear triggers, triggers removed by
+    an earlier callback of the same check() do not fire.
+    """
+    def __init__(self, cell_size=TILE_SIZE * 4):
+        self.spatial_hash = SpatialHash(cell_size)
+        self.order_counter = count()
+
+    def __len__(self):
+        return len(self.spatial_hash)
+
+    def add(self, rect, callback, priority=0, once=True):
+        trigger = Trigger(rect, callback, priority, once,
+                          next(self.order_counter))
+        self.spatial_hash.insert(trigger, rect)
+        return trigger
+
+    def move(self, trigger, rect):
+        trigger.rect = rect
+        self.spatial_hash.move(trigger, rect)
+
+    def remove(self, trigger):
+        self.spatial_hash.remove(trigger)
+
+    def clear(self):
+        self.spatial_hash.clear()
+
+    def query(self, rect):
+        """
+        Returns the triggers overlapping rect, in firing order.
+        """
+        found = [trigger for trigger in self.spatial_hash.query(rect)
+                 if trigger.rect.colliderect(rect)]
+
+        return sorted(found, key=lambda trigger: (trigger.priority,
+                                                  trigger.order))
+
+    def check(self, rect):
+        for trigger in self.query(rect):
+            if trigger not in self.spatial_hash:
+                continue
+
+            if trigger.once:
+                self.remove(trigger)
+            trigger.callback()